@@ -0,0 +1,399 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Micro-benchmarks of the geometry and orientation kernels
+
+Every kernel is timed per call and in batch, the result is in operations
+(points, frames or pixels) per second. Absolute numbers only mean something
+on one machine, so the baseline keeps every kernel relative to a reference
+kernel of the same kind (plain Python or NumPy) timed in the same run. The
+baseline is per machine and only compared against with --check.
+
+    $ python3 benchmarks/kernels.py --update-baseline
+    $ python3 benchmarks/kernels.py --check
+    $ blender -b samples/equirect_stable.blend -P benchmarks/kernels.py -- --markers
+
+Outside of Blender the geometry.py and NumPy kernels run. Inside Blender the
+mathutils kernels of core.py are timed as well, and --markers uses the
+focus and target tracks of the scene panorama clip instead of random
+markers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from movie_clip_editor_panorama_tracker import geometry, reproject, solver
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+# per machine, never shared
+BASELINE = os.environ.get("PANORAMA_TRACKER_BASELINE") or \
+    os.path.join(os.path.expanduser("~"), ".panorama_tracker", "benchmark_baseline.json")
+
+# slower than the baseline, relative to the reference kernels, by more than this fraction fails --check
+TOLERANCE = 0.25
+
+# smallest time a benchmark is run for, per repeat
+MIN_TIME = 0.05
+REPEAT = 9
+
+
+# ###############################
+# Timing
+# ###############################
+
+class Result:
+    """
+    median time of a benchmark and the operations it did per call
+    kind : 'python' or 'numpy', the reference kernel it is compared to
+    relative : median speed relative to the reference kernel, timed alongside
+    """
+
+    def __init__(self, name, seconds, operations, kind='python', relative=0.0):
+        self.name = name
+        self.seconds = seconds
+        self.operations = operations
+        self.kind = kind
+        self.relative = relative
+
+    @property
+    def ops_per_sec(self):
+        return self.operations / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return "{0:<48} {1:>14.1f} ops/s {2:>12.3f} us/call {3:>10.4f}x {4}".format(
+                self.name, self.ops_per_sec, self.seconds * 1e6, self.relative, self.kind)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def reference_workloads():
+    """fixed workloads the kernels are compared to, (function, operations) per kind"""
+    values = [i * 0.001 for i in range(1000)]
+    array = np.linspace(0.0, 1.0, 1 << 16, dtype=np.float32)
+
+    def python_reference():
+        total = 0.0
+        for value in values:
+            total += value * value
+        return total
+
+    def numpy_reference():
+        return np.arctan2(np.sin(array), np.cos(array))
+
+    return {
+            'python': (python_reference, len(values)),
+            'numpy': (numpy_reference, len(array)),
+            }
+
+
+_references = {}
+
+
+def calls_per_repeat(function):
+    """number of calls so a repeat lasts at least MIN_TIME"""
+    number = 1
+    while True:
+        elapsed = time_calls(function, number) * number
+        if elapsed >= MIN_TIME:
+            return number
+        number *= 2 if elapsed <= 0.0 else max(2, int(MIN_TIME / elapsed) + 1)
+
+
+def time_calls(function, number):
+    """seconds per call of function()"""
+    start = time.perf_counter()
+    for i in range(number):
+        function()
+    return (time.perf_counter() - start) / number
+
+
+def measure(name, function, operations=1, kind='python'):
+    """
+    time function() in repeats alternating with its reference kernel, return the Result of the median repeat
+    the relative speed follows the machine load, the absolute numbers do not
+    """
+    if not _references:
+        _references.update(reference_workloads())
+
+    reference, reference_operations = _references[kind]
+
+    number = calls_per_repeat(function)
+    reference_number = calls_per_repeat(reference)
+
+    times = []
+    ratios = []
+    for i in range(REPEAT):
+        reference_seconds = time_calls(reference, reference_number)
+        seconds = time_calls(function, number)
+
+        times.append(seconds)
+        ratios.append((operations / seconds) / (reference_operations / reference_seconds))
+
+    return Result(name, median(times), operations, kind, median(ratios))
+
+
+# ###############################
+# Data
+# ###############################
+
+def ensure_registered():
+    """register the addon when Blender runs without it enabled"""
+    if not hasattr(bpy.types.MovieClip, "panorama_settings"):
+        import movie_clip_editor_panorama_tracker
+        movie_clip_editor_panorama_tracker.register()
+
+
+def synthetic_markers(count, seed=0):
+    """random focus and target positions, always a few degrees apart"""
+    random = np.random.RandomState(seed)
+    focus = random.uniform(0.05, 0.95, (count, 2))
+    target = (focus + random.uniform(0.02, 0.1, (count, 2))) % 1.0
+    return focus, target
+
+
+def scene_markers():
+    """focus and target positions of every frame of the scene panorama clip"""
+    from movie_clip_editor_panorama_tracker.tracks import get_track_data
+
+    scene = bpy.context.scene
+    movieclip = bpy.data.movieclips.get(scene.panorama_movieclip) or bpy.data.movieclips[0]
+    settings = movieclip.panorama_settings
+    tracking = movieclip.tracking.objects[movieclip.tracking.active_object_index]
+
+    focus = get_track_data(tracking, settings.focus)
+    target = get_track_data(tracking, settings.target)
+    if not focus or not target:
+        raise RuntimeError("'{0}' has no focus and target tracks".format(movieclip.name))
+
+    frames = np.arange(movieclip.frame_start, movieclip.frame_start + movieclip.frame_duration)
+    focus_co, focus_valid = focus.coordinates(frames)
+    target_co, target_valid = target.coordinates(frames)
+    valid = focus_valid & target_valid
+
+    return focus_co[valid], target_co[valid]
+
+
+# ###############################
+# Benchmarks
+# ###############################
+
+def numpy_benchmarks(focus, target, width, height):
+    """the bpy-free kernels, solver.py and reproject.py"""
+    count = len(focus)
+    reference = (0.1, 0.2, 0.3)
+    matrices = solver.orientation_matrices(focus, target, True, reference)
+
+    results = [
+            measure("equirectangular_to_sphere[call]", lambda: solver.equirectangular_to_sphere(focus[:1])),
+            measure("equirectangular_to_sphere[batch]", lambda: solver.equirectangular_to_sphere(focus), count, 'numpy'),
+            measure("matrix_to_euler[call]", lambda: solver.matrix_to_euler(matrices[:1])),
+            measure("matrix_to_euler[batch]", lambda: solver.matrix_to_euler(matrices), count, 'numpy'),
+            measure("solve_orientations[call]", lambda: solver.solve_orientations(focus[:1], target[:1], True, reference)),
+            measure("solve_orientations[batch]", lambda: solver.solve_orientations(focus, target, True, reference), count, 'numpy'),
+            ]
+
+    # the per-pixel transform of preview.fp
+    grid = reproject.get_direction_grid(width, height)
+    matrix = matrices[count // 2]
+
+    def transform():
+        return reproject.world_to_equirectangular(grid.rotate(matrix))
+
+    results.append(measure("equirectangular2world[batch]", lambda: reproject.DirectionGrid(width, height), width * height, 'numpy'))
+    results.append(measure("pixel_transform[batch]", transform, width * height, 'numpy'))
+
+    image = np.random.RandomState(0).randint(0, 255, (height, width, 3)).astype(np.uint8)
+    results.append(measure("reproject[batch]", lambda: reproject.reproject(image, matrix, yaw_tolerance=-1.0), width * height, 'numpy'))
+
+    return results
+
+
+def geometry_benchmarks(focus, target):
+    """the single frame kernels of geometry.py, what the frame change handler runs"""
+    uv = tuple(focus[0])
+    other = tuple(target[0])
+    reference = (0.1, 0.2, 0.3)
+
+    vecx = geometry.equirectangular_to_sphere(uv)
+    vecy = geometry.equirectangular_to_sphere(other)
+    vecz = geometry.normalize(geometry.cross(vecx, vecy))
+    nvecy = geometry.normalize(geometry.cross(vecz, vecx))
+
+    return [
+            measure("geometry.equirectangular_to_sphere[call]", lambda: geometry.equirectangular_to_sphere(uv)),
+            measure("geometry.sphere_to_euler[call]", lambda: geometry.sphere_to_euler(vecx, nvecy, vecz)),
+            measure("geometry.mapping_node_order_flip[call]", lambda: geometry.mapping_node_order_flip(reference)),
+            measure("geometry.solve_orientation[call]", lambda: geometry.solve_orientation(uv, other, True, reference)),
+            ]
+
+
+def mathutils_benchmarks(focus, target):
+    """the per-frame mathutils kernels of core.py, only inside Blender"""
+    from mathutils import Euler
+    from movie_clip_editor_panorama_tracker import core
+
+    vecx = core.equirectangular_to_sphere(focus[0])
+    vecy = core.equirectangular_to_sphere(target[0])
+    vecz = vecx.cross(vecy)
+    vecz.normalize()
+    nvecy = vecz.cross(vecx)
+    nvecy.normalize()
+
+    orientation = Euler((0.1, 0.2, 0.3))
+    scene = bpy.context.scene
+
+    results = [
+            measure("core.equirectangular_to_sphere[call]", lambda: core.equirectangular_to_sphere(focus[0])),
+            measure("core.sphere_to_euler[call]", lambda: core.sphere_to_euler(vecx, nvecy, vecz)),
+            measure("core.mapping_node_order_flip[call]", lambda: core.mapping_node_order_flip(orientation)),
+            ]
+
+    if bpy.data.movieclips.get(scene.panorama_movieclip):
+        results.append(measure("core.calculate_orientation[call]", lambda: core.calculate_orientation(scene)))
+
+    return results
+
+
+# ###############################
+# Baseline
+# ###############################
+
+def compare(scores, baseline, tolerance):
+    """return the names of the scores slower than the baseline"""
+    regressions = []
+
+    for name in sorted(scores):
+        expected = baseline.get(name)
+        if not expected:
+            continue
+
+        ratio = scores[name] / expected
+        status = "ok"
+
+        if ratio < 1.0 - tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+
+        print("  {0:<46} {1:>6.2f}x baseline  {2}".format(name, ratio, status))
+
+    return regressions
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark the geometry and orientation kernels")
+    parser.add_argument("--markers", action="store_true", help="use the tracks of the scene panorama clip (inside Blender)")
+    parser.add_argument("--count", type=int, default=10000, help="number of synthetic frames for the batch benchmarks")
+    parser.add_argument("--width", type=int, default=1024, help="width of the image for the pixel benchmarks")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline json file of this machine")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="compare with the baseline, exit with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, as a fraction")
+    parser.add_argument("--output", help="write the results to this json file")
+    args = parser.parse_args(argv)
+
+    if bpy:
+        ensure_registered()
+
+    if args.markers:
+        if not bpy:
+            parser.error("--markers needs to run inside Blender")
+        focus, target = scene_markers()
+    else:
+        focus, target = synthetic_markers(args.count)
+
+    results = geometry_benchmarks(focus, target)
+    results += numpy_benchmarks(focus, target, args.width, args.width // 2)
+    if bpy:
+        results += mathutils_benchmarks(focus, target)
+
+    for result in results:
+        print(result)
+
+    scores = dict((result.name, result.relative) for result in results)
+
+    if args.output:
+        data = {
+                "ops_per_sec": dict((result.name, round(result.ops_per_sec, 1)) for result in results),
+                "relative": dict((name, round(score, 6)) for name, score in scores.items()),
+                }
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        baseline.update(scores)
+
+        folder = os.path.dirname(args.baseline)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+        print("baseline written to {0}".format(args.baseline))
+        return 0
+
+    if not args.check:
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at {0}, run with --update-baseline first".format(args.baseline))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    print("compared to {0}:".format(args.baseline))
+    regressions = compare(scores, baseline, args.tolerance)
+
+    if regressions:
+        print("{0} benchmark(s) slower than the baseline: {1}".format(len(regressions), ", ".join(regressions)))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    status = main()
+    if status:
+        sys.exit(status)
@@ -0,0 +1,322 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+End-to-end benchmark on a real shot, in Blender background mode
+
+    $ blender -b samples/equirect_stable.blend -P benchmarks/scene.py -- --output report.json
+
+Times the 'Panorama Camera' setup, the frame change handler over the
+frame range (evaluating the tracks and from the baked table), and the
+stabilized frames per second of every output backend available:
+the CPU renderer, the parallel export, the CPU preview and Cycles.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import bpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import movie_clip_editor_panorama_tracker as addon
+
+from movie_clip_editor_panorama_tracker import (
+        bake,
+        core,
+        preview_cpu,
+        profiling,
+        )
+
+from movie_clip_editor_panorama_tracker.export import export_frames
+from movie_clip_editor_panorama_tracker.render import (
+        render_frames,
+        scene_frame_jobs,
+        scene_resolution,
+        )
+
+
+# ###############################
+# Setup
+# ###############################
+
+def ensure_registered():
+    """register the addon when Blender runs without it enabled"""
+    if not hasattr(bpy.types.MovieClip, "panorama_settings"):
+        addon.register()
+
+
+def get_movieclip(scene):
+    movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+
+    if not movieclip:
+        for movieclip in bpy.data.movieclips:
+            settings = movieclip.panorama_settings
+            if settings.focus and settings.target:
+                break
+        else:
+            raise RuntimeError("no movieclip with focus and target tracks")
+
+    return movieclip
+
+
+def clip_editor_override(scene, movieclip):
+    """context override of a clip editor showing the movieclip, operators poll for one"""
+    screen = bpy.data.screens[0]
+    for candidate in bpy.data.screens:
+        if any(area.type == 'CLIP_EDITOR' for area in candidate.areas):
+            screen = candidate
+            break
+
+    area = next((area for area in screen.areas if area.type == 'CLIP_EDITOR'), screen.areas[0])
+    area.type = 'CLIP_EDITOR'
+
+    space = area.spaces.active
+    space.clip = movieclip
+    space.view = 'CLIP'
+
+    region = next(region for region in area.regions if region.type == 'WINDOW')
+
+    return {
+            'screen': screen,
+            'area': area,
+            'region': region,
+            'space_data': space,
+            'scene': scene,
+            'edit_movieclip': movieclip,
+            }
+
+
+def timer_report(timer):
+    data = timer.to_dict()
+    data["per_second"] = 1.0 / timer.mean if timer.mean else 0.0
+    return data
+
+
+# ###############################
+# Benchmarks
+# ###############################
+
+def benchmark_camera(scene, movieclip, repeat):
+    """time the Panorama Camera operator"""
+    override = clip_editor_override(scene, movieclip)
+    timer = profiling.Timer("panorama_camera")
+
+    # every run flips the orientation, an odd count leaves it flipped once like a single click
+    repeat += 1 - repeat % 2
+
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = bpy.ops.clip.panorama_camera(override)
+        timer.add(time.perf_counter() - start)
+
+        if result != {'FINISHED'}:
+            raise RuntimeError("Panorama Camera failed: {0}".format(result))
+
+    return timer_report(timer)
+
+
+def benchmark_handler(scene, movieclip, frames, baked):
+    """time the frame change handler alone, and frame_set (animation and handlers) for every frame"""
+    settings = movieclip.panorama_settings
+    settings.bake_orientation = baked
+    bake.invalidate(movieclip)
+
+    bake_seconds = 0.0
+    if baked:
+        start = time.perf_counter()
+        bake.bake_table(movieclip)
+        bake_seconds = time.perf_counter() - start
+
+    handler = profiling.Timer("update_panorama_orientation")
+    frame_set = profiling.Timer("frame_set")
+
+    for frame in frames:
+        start = time.perf_counter()
+        scene.frame_set(frame)
+        frame_set.add(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        core.update_panorama_orientation(scene)
+        handler.add(time.perf_counter() - start)
+
+    report = {
+            "handler": timer_report(handler),
+            "frame_set": timer_report(frame_set),
+            }
+
+    if baked:
+        report["bake_seconds"] = bake_seconds
+
+    return report
+
+
+def backend_report(frames, seconds):
+    return {
+            "frames": frames,
+            "seconds": seconds,
+            "fps": frames / seconds if seconds else 0.0,
+            }
+
+
+def benchmark_cpu(jobs, width, height, yaw_tolerance):
+    start = time.perf_counter()
+    render_frames(jobs, width, height, None, None, yaw_tolerance)
+    return backend_report(len(jobs), time.perf_counter() - start)
+
+
+def benchmark_export(jobs, width, height, yaw_tolerance, workers):
+    start = time.perf_counter()
+    export_frames(jobs, workers, 4, width, height, yaw_tolerance)
+    return backend_report(len(jobs), time.perf_counter() - start)
+
+
+def benchmark_preview_cpu(scene, frames):
+    preview_cpu.stats.reset()
+
+    start = time.perf_counter()
+    for frame in frames:
+        scene.frame_current = frame
+
+        # what the handler does with the preview enabled
+        orientation = core.calculate_orientation(scene)
+        matrix = core.mapping_node_order_flip(orientation).to_matrix().inverted().to_4x4()
+        preview_cpu.update_preview(scene, matrix)
+
+    report = backend_report(len(frames), time.perf_counter() - start)
+    report["width"] = preview_cpu.PREVIEW_WIDTH
+    preview_cpu.clear()
+    return report
+
+
+def benchmark_cycles(scene, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        scene.frame_set(frame)
+        bpy.ops.render.render(write_still=True)
+
+    return backend_report(len(frames), time.perf_counter() - start)
+
+
+# ###############################
+# Main
+# ###############################
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the panorama stabilization")
+    parser.add_argument("--output", help="json report, printed if not set")
+    parser.add_argument("--frames", type=int, default=0, help="only use the first frames of the range, 0 for all")
+    parser.add_argument("--camera-repeat", type=int, default=5, help="runs of the Panorama Camera operator")
+    parser.add_argument("--workers", type=int, default=0, help="processes of the export backend, 0 for one per CPU")
+    parser.add_argument("--cycles-frames", type=int, default=3, help="frames rendered with Cycles, 0 to skip it")
+    parser.add_argument("--backends", default="cpu,export,preview_cpu,cycles", help="comma separated backends to time")
+    args = parser.parse_args(argv)
+
+    ensure_registered()
+
+    scene = bpy.context.scene
+    movieclip = get_movieclip(scene)
+
+    report = {
+            "file": bpy.data.filepath,
+            "blender": bpy.app.version_string,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "movieclip": movieclip.name,
+            "resolution": list(movieclip.size),
+            }
+
+    report["camera_setup"] = benchmark_camera(scene, movieclip, args.camera_repeat)
+
+    frames = list(range(scene.frame_start, scene.frame_end + 1))
+    if args.frames:
+        frames = frames[:args.frames]
+    report["frames"] = len(frames)
+
+    report["frame_change"] = {
+            "tracks": benchmark_handler(scene, movieclip, frames, False),
+            "baked": benchmark_handler(scene, movieclip, frames, True),
+            }
+
+    # stabilized frames go to a temporary folder
+    output = tempfile.mkdtemp(prefix="panorama_benchmark_")
+    scene.render.filepath = os.path.join(output, "frame_")
+    scene.frame_end = frames[-1]
+
+    jobs = [job for job in scene_frame_jobs(scene, movieclip) if job.frame in frames]
+    width, height = scene_resolution(scene)
+    yaw_tolerance = movieclip.panorama_settings.yaw_tolerance
+    backends = args.backends.split(",")
+
+    def export():
+        result = benchmark_export(jobs, width, height, yaw_tolerance, args.workers)
+        result["workers"] = args.workers or multiprocessing.cpu_count()
+        return result
+
+    runs = (
+            ("cpu", lambda: benchmark_cpu(jobs, width, height, yaw_tolerance)),
+            ("export", export),
+            ("preview_cpu", lambda: benchmark_preview_cpu(scene, frames)),
+            ("cycles", lambda: benchmark_cycles(scene, frames[:args.cycles_frames]) if args.cycles_frames else None),
+            )
+
+    results = {}
+    try:
+        for name, run in runs:
+            if name not in backends:
+                continue
+
+            # a backend that is not available (e.g. the export without Pillow) does not stop the others
+            try:
+                results[name] = run()
+            except Exception as E:
+                print("Panorama Tracker: {0} backend failed: {1}".format(name, E))
+                results[name] = {"error": "{0}: {1}".format(type(E).__name__, E)}
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+    # the OpenGL preview needs a window
+    results["preview_gl"] = None
+    report["backends"] = results
+
+    data = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+        print("Panorama Tracker: benchmark report written to {0}".format(args.output))
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -30,9 +30,19 @@ bl_info = {
     "category": "Movie Tracking"}
 
 
-from . import core
-from . import preview
-from . import ui
+try:
+    import bpy
+except ImportError:
+    # running outside of Blender (e.g. a render node)
+    # only the bpy-free modules can be imported
+    bpy = None
+
+if bpy:
+    from . import core
+    from . import export
+    from . import preview
+    from . import render
+    from . import ui
 
 
 # ###############################
@@ -40,13 +50,17 @@ from . import ui
 # ###############################
 def register():
     core.register()
+    export.register()
     preview.register()
+    render.register()
     ui.register()
 
 
 def unregister():
     core.unregister()
+    export.unregister()
     preview.unregister()
+    render.unregister()
     ui.unregister()
 
 
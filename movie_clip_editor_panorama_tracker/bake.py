@@ -0,0 +1,127 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+import numpy as np
+
+from . import solver
+from . import stabilization
+from .tracks import get_track_data
+
+
+# ###############################
+# Orientation Table
+# ###############################
+
+class OrientationTable:
+    """per-frame orientation of a movieclip, solved for all the frames at once"""
+
+    def __init__(self, frame_start, signature, orientations, matrices):
+        self.frame_start = frame_start
+        self.signature = signature
+        # (N,3) euler, as returned by core.calculate_orientation
+        self.orientations = orientations
+        # (N,3,3) compound orientation matrices
+        self.matrices = matrices
+
+    def __len__(self):
+        return len(self.orientations)
+
+    @property
+    def frame_end(self):
+        return self.frame_start + len(self) - 1
+
+    def get(self, frame):
+        """return the orientation for the frame, or None if not baked"""
+        index = frame - self.frame_start
+
+        if index < 0 or index >= len(self):
+            return None
+
+        return tuple(self.orientations[index].tolist())
+
+
+_tables = {}
+
+
+def settings_signature(settings):
+    """everything the orientation depends on besides the markers themselves"""
+    return (settings.focus, settings.target, settings.flip, tuple(settings.orientation),
+            settings.data_filepath)
+
+
+def get_table(movieclip):
+    """return the baked table for the movieclip if it is still valid"""
+    table = _tables.get(movieclip.name)
+
+    if table is None:
+        return None
+
+    if table.signature != settings_signature(movieclip.panorama_settings):
+        del _tables[movieclip.name]
+        return None
+
+    return table
+
+
+def bake_table(movieclip):
+    """compute the orientation of every frame of the movieclip"""
+    settings = movieclip.panorama_settings
+    tracking = movieclip.tracking.objects[movieclip.tracking.active_object_index]
+    focus = get_track_data(tracking, settings.focus)
+    target = get_track_data(tracking, settings.target)
+
+    frame_start = movieclip.frame_start
+    frames = np.arange(frame_start, frame_start + movieclip.frame_duration)
+
+    if focus and target:
+        focus_co, focus_valid = focus.coordinates(frames)
+        target_co, target_valid = target.coordinates(frames)
+        valid = focus_valid & target_valid
+    else:
+        focus_co = target_co = np.zeros((len(frames), 2))
+        valid = np.zeros(len(frames), dtype=bool)
+
+    matrices = solver.orientation_matrices(focus_co, target_co, settings.flip, settings.orientation)
+    orientations = -solver.matrix_to_euler(matrices)
+    orientations[~valid] = 0.0
+    matrices[~valid] = np.identity(3)
+
+    table = OrientationTable(frame_start, settings_signature(settings), orientations, matrices)
+    _tables[movieclip.name] = table
+    return table
+
+
+def load_table(movieclip, filepath):
+    """use the orientations of a stabilization data file, they are memory-mapped and read on demand"""
+    data = stabilization.load(filepath)
+    records = data.records
+
+    table = OrientationTable(data.frame_start, settings_signature(movieclip.panorama_settings),
+                             records['orientation'], records['matrix'])
+    _tables[movieclip.name] = table
+    return table
+
+
+def invalidate(movieclip=None):
+    """discard the baked table of the movieclip, or all of them"""
+    if movieclip is None:
+        _tables.clear()
+    else:
+        _tables.pop(movieclip.name, None)
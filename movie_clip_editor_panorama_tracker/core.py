@@ -24,8 +24,11 @@ from bpy.app.handlers import persistent
 
 from bpy.props import (
         FloatVectorProperty,
+        IntProperty,
         PointerProperty,
         BoolProperty,
+        EnumProperty,
+        FloatProperty,
         StringProperty,
         )
 
@@ -36,18 +39,24 @@ from mathutils import (
         )
 
 from math import (
-        sin,
-        cos,
         pi,
-        acos,
-        asin,
-        atan2,
-        radians,
-        degrees,
-        sqrt,
         )
 
-from .preview import show_preview_update
+from .preview import (
+        preview_backend_update,
+        show_preview_update,
+        )
+
+from . import preview_cpu
+
+from . import bake
+from . import geometry
+from . import keyframes
+from . import profiling
+from . import stabilization
+
+# rest rotation of the panorama camera, looking at the center of the equirectangular
+CAMERA_ROTATION = (pi * 0.5, 0.0, -pi * 0.5)
 
 # ###############################
 # Global Functions
@@ -148,71 +157,93 @@ def equirectangular_to_sphere(uv):
     """
     convert a 2d point to 3d
     uv : 0,0 (bottom left) 1,1 (top right)
-    uv : +pi, -pi/2 (bottom left) -pi, +pi/2 (top right)
     """
-    u,v = uv
-
-    phi = (0.5 - u) * 2 * pi
-    theta = (v - 0.5) * pi
-    r = cos(theta)
-
-    x = cos(phi) * r
-    y = sin(phi) * r
-    z = sin(theta)
-
-    return Vector((x,y,z))
+    return Vector(geometry.equirectangular_to_sphere(uv))
 
 
 def sphere_to_euler(vecx, vecy, vecz):
     """
     convert sphere orientation vectors to euler
     """
-    M = Matrix((vecx, vecy, vecz))
-    return M.to_euler()
+    return Euler(geometry.sphere_to_euler(vecx, vecy, vecz))
 
 
 # ###############################
 # Main function
 # ###############################
 
+@profiling.timed("calculate_orientation")
 def calculate_orientation(scene):
     """return the compound orientation of the tracker + scene orientations"""
 
     movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
     if not movieclip: return (0,0,0)
 
+    frame_current = scene.frame_current
+
+    settings = movieclip.panorama_settings
+
+    if settings.bake_orientation or settings.data_filepath:
+        table = get_orientation_table(movieclip)
+
+        orientation = table.get(frame_current)
+        if orientation is not None:
+            return orientation
+
+    return solve_orientation(movieclip, frame_current)
+
+
+# stabilization data files that could not be read, filepath: error
+_data_errors = {}
+
+
+def get_data_error(settings):
+    """return why the stabilization data file of the settings could not be read, or None"""
+    if not settings.data_filepath:
+        return None
+
+    return _data_errors.get(bpy.path.abspath(settings.data_filepath))
+
+
+def get_orientation_table(movieclip):
+    """
+    return the baked orientations, read from the stabilization data file when one is set
+    a file that cannot be read is reported once, the tracks are solved instead
+    """
+    table = bake.get_table(movieclip)
+    if table:
+        return table
+
+    settings = movieclip.panorama_settings
+    if settings.data_filepath:
+        filepath = bpy.path.abspath(settings.data_filepath)
+
+        if filepath not in _data_errors:
+            try:
+                return bake.load_table(movieclip, filepath)
+            except (IOError, OSError, ValueError) as E:
+                _data_errors[filepath] = str(E)
+                print("Panorama Tracker: stabilization data not used, solving the tracks instead: {0}".format(E))
+
+    return bake.bake_table(movieclip)
+
+
+def solve_orientation(movieclip, frame):
+    """return the orientation of a single frame, evaluated from the tracks"""
     settings = movieclip.panorama_settings
 
     tracking = movieclip.tracking.objects[movieclip.tracking.active_object_index]
     focus = tracking.tracks.get(settings.focus)
     target = tracking.tracks.get(settings.target)
-    frame_current = scene.frame_current
 
     if not focus or not target: return (0,0,0)
 
-    focus_marker = focus.markers.find_frame(frame_current)
-    target_marker = target.markers.find_frame(frame_current)
+    focus_marker = focus.markers.find_frame(frame)
+    target_marker = target.markers.find_frame(frame)
 
     if not focus_marker or not target_marker: return (0,0,0)
 
-    vecx = equirectangular_to_sphere(focus_marker.co)
-    vecy = equirectangular_to_sphere(target_marker.co)
-
-    if settings.flip:
-        vecz = vecx.cross(vecy)
-    else:
-        vecz = vecy.cross(vecx)
-    vecz.normalize()
-
-    # retarget y axis again
-    nvecy = vecz.cross(vecx)
-    nvecy.normalize()
-
-    # store orientation
-    orientation = sphere_to_euler(vecx, nvecy, vecz)
-    orientation = (settings.orientation.to_matrix() * orientation.to_matrix()).to_euler()
-
-    return (-orientation[0], -orientation[1], -orientation[2])
+    return geometry.solve_orientation(focus_marker.co, target_marker.co, settings.flip, settings.orientation)
 
 
 def set_3d_cursor(scene):
@@ -253,6 +284,7 @@ class CLIP_OT_panorama_reset(bpy.types.Operator):
 
         return valid_track(movieclip, settings.focus) or valid_track(movieclip, settings.target)
 
+    @profiling.timed_method("clip.panorama_reset")
     def execute(self, context):
         scene = context.scene
         movieclip = context.edit_movieclip
@@ -282,6 +314,7 @@ class CLIP_OT_panorama_camera(bpy.types.Operator):
 
         return valid_track(movieclip, settings.focus) and valid_track(movieclip, settings.target)
 
+    @profiling.timed_method("clip.panorama_camera")
     def execute(self, context):
         scene = context.scene
         movieclip = context.edit_movieclip
@@ -309,7 +342,7 @@ class CLIP_OT_panorama_camera(bpy.types.Operator):
         camera.data.cycles.panorama_type = 'EQUIRECTANGULAR'
 
         camera.location[2] = 0.0
-        camera.rotation_euler = Euler((pi*0.5, 0, -pi*0.5))
+        camera.rotation_euler = Euler(CAMERA_ROTATION)
         scene.camera = camera
 
         imagepath = movieclip.filepath
@@ -360,7 +393,7 @@ class CLIP_OT_panorama_camera(bpy.types.Operator):
 
         # Uses the current orientation as the final one
         settings.orientation = (0,0,0)
-        orientation = calculate_orientation(scene)
+        orientation = solve_orientation(movieclip, scene.frame_current)
         settings.orientation = Euler((-orientation[0], -orientation[1], -orientation[2])).to_matrix().inverted().to_euler()
 
         return {'FINISHED'}
@@ -385,6 +418,7 @@ class CLIP_OT_panorama_focus(bpy.types.Operator):
 
         return not valid_track(movieclip, settings.focus)
 
+    @profiling.timed_method("clip.panorama_focus")
     def execute(self, context):
         scene = context.scene
         movieclip = context.edit_movieclip
@@ -420,6 +454,7 @@ class CLIP_OT_panorama_target(bpy.types.Operator):
 
         return not valid_track(movieclip, settings.target)
 
+    @profiling.timed_method("clip.panorama_target")
     def execute(self, context):
         scene = context.scene
         movieclip = context.edit_movieclip
@@ -436,38 +471,243 @@ class CLIP_OT_panorama_target(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class CLIP_OT_panorama_bake(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_bake"
+    bl_label = "Bake Orientation"
+    bl_description = "Compute the orientation of every frame once and use it during playback and render"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        if not context_clip(context):
+            return False
+
+        movieclip = context.edit_movieclip
+        settings = movieclip.panorama_settings
+
+        return valid_track(movieclip, settings.focus) and valid_track(movieclip, settings.target)
+
+    @profiling.timed_method("clip.panorama_bake")
+    def execute(self, context):
+        movieclip = context.edit_movieclip
+        settings = movieclip.panorama_settings
+
+        bake.invalidate(movieclip)
+        settings.bake_orientation = True
+        table = bake.bake_table(movieclip)
+
+        self.report({'INFO'}, "Baked {0} frames".format(len(table)))
+        update_panorama_orientation(context.scene)
+
+        return {'FINISHED'}
+
+
+class CLIP_OT_panorama_keyframes(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_keyframes"
+    bl_label = "Bake Keyframes"
+    bl_description = "Write the orientation of every frame as keyframes, rendering then runs without the frame change handler"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    target = EnumProperty(
+            name="Target",
+            items=(('NODE', "Mapping Node", "Animate the rotation of the Panorama Environment Texture mapping"),
+                   ('CAMERA', "Camera", "Animate the rotation of the Panorama Camera"),
+                   ),
+            default='NODE',
+            )
+    interpolation = EnumProperty(
+            name="Interpolation",
+            items=(('CONSTANT', "Constant", "Hold the orientation of every frame"),
+                   ('LINEAR', "Linear", "Interpolate the orientation between frames (motion blur, sub-frames)"),
+                   ),
+            default='CONSTANT',
+            )
+
+    @classmethod
+    def poll(cls, context):
+        scene = context.scene
+        return bpy.data.movieclips.get(scene.panorama_movieclip) is not None
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    @profiling.timed_method("clip.panorama_keyframes")
+    def execute(self, context):
+        scene = context.scene
+        movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+        settings = movieclip.panorama_settings
+
+        world = scene.world
+        nodetree = world.node_tree if world else None
+        tex_env = nodetree.nodes.get("Panorama Environment Texture") if nodetree else None
+        camera = bpy.data.objects.get('Panorama Camera')
+
+        if self.target == 'NODE' and not tex_env:
+            self.report({'ERROR'}, "No Panorama Environment Texture, run 'Panorama Camera' first")
+            return {'CANCELLED'}
+
+        if self.target == 'CAMERA' and not camera:
+            self.report({'ERROR'}, "No Panorama Camera, run 'Panorama Camera' first")
+            return {'CANCELLED'}
+
+        table = get_orientation_table(movieclip)
+
+        frames = list(range(scene.frame_start, scene.frame_end + 1))
+        orientations = []
+        for frame in frames:
+            orientation = table.get(frame)
+            if orientation is None:
+                orientation = solve_orientation(movieclip, frame)
+            orientations.append(orientation)
+
+        # only one of the node and the camera is rotated
+        if self.target == 'NODE':
+            keyframes.set_fcurves(nodetree, keyframes.NODE_ROTATION_PATH, frames,
+                                  keyframes.node_rotations(orientations), self.interpolation)
+
+            if camera:
+                keyframes.remove_fcurves(camera, "rotation_euler")
+                camera.rotation_euler = CAMERA_ROTATION
+        else:
+            keyframes.set_fcurves(camera, "rotation_euler", frames,
+                                  keyframes.camera_rotations(orientations, CAMERA_ROTATION), self.interpolation)
+
+            if tex_env:
+                keyframes.remove_fcurves(nodetree, keyframes.NODE_ROTATION_PATH)
+                tex_env.texture_mapping.rotation = (0,0,0)
+
+        settings.use_keyframes = True
+
+        self.report({'INFO'}, "Keyed {0} frames".format(len(frames)))
+        return {'FINISHED'}
+
+
+class CLIP_OT_panorama_save_data(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_save_data"
+    bl_label = "Save Stabilization Data"
+    bl_description = "Write the orientation of every frame and the clip mapping to a file render nodes can read without the tracking data"
+    bl_options = {'REGISTER'}
+
+    filepath = StringProperty(subtype='FILE_PATH')
+    filter_glob = StringProperty(default="*" + stabilization.EXTENSION, options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        if not context_clip(context):
+            return False
+
+        movieclip = context.edit_movieclip
+        settings = movieclip.panorama_settings
+
+        return valid_track(movieclip, settings.focus) and valid_track(movieclip, settings.target)
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = bpy.path.ensure_ext(bpy.path.clean_name(context.edit_movieclip.name), stabilization.EXTENSION)
+
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    @profiling.timed_method("clip.panorama_save_data")
+    def execute(self, context):
+        movieclip = context.edit_movieclip
+        filepath = bpy.path.ensure_ext(bpy.path.abspath(self.filepath), stabilization.EXTENSION)
+
+        if movieclip.panorama_settings.data_filepath:
+            # the table in use comes from a file, solve the tracks without keeping the result
+            table = bake.bake_table(movieclip)
+            bake.invalidate(movieclip)
+        else:
+            table = bake.get_table(movieclip) or bake.bake_table(movieclip)
+
+        data = stabilization.from_table(table, movieclip.frame_offset, get_sequence_start(movieclip),
+                                        movieclip.frame_start, movieclip.size[0], movieclip.size[1],
+                                        bpy.path.abspath(movieclip.filepath))
+
+        try:
+            stabilization.write(filepath, data)
+        except (IOError, OSError) as E:
+            self.report({'ERROR'}, "Could not save {0}: {1}".format(filepath, E))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Saved {0} frames to {1}".format(len(data), filepath))
+        return {'FINISHED'}
+
+
 def update_orientation(self, context):
     """callback called when scene orientation is changed"""
+    bake.invalidate(self.id_data)
     update_panorama_orientation(context.scene)
 
 
+def update_bake(self, context):
+    """callback called when a setting the baked orientation depends on is changed"""
+    bake.invalidate(self.id_data)
+    _data_errors.clear()
+
+
+# mapping rotation changes (radians) below this are not written to the node
+ROTATION_EPSILON = 1e-6
+
+
 @persistent
+@profiling.timed("update_panorama_orientation")
 def update_panorama_orientation(scene):
     """callback function called every frame"""
     pg = bpy.panorama_globals
-    is_enabled = pg.is_enabled
-    orientation = None
 
-    if is_enabled:
-        orientation = calculate_orientation(scene)
-        pg.orientation = mapping_node_order_flip(orientation).to_matrix().inverted().to_4x4()
+    movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+    if not movieclip:
+        if pg.is_enabled:
+            pg.orientation = Matrix.Identity(4)
+        return
 
+    # the orientation is animated, rendering does not depend on the handler
+    tex_env = None
+    if not movieclip.panorama_settings.use_keyframes:
+        tex_env = get_environment_texture(scene)
+
+    if not pg.is_enabled and not tex_env: return
+
+    # computed once, shared by the preview and the node
+    orientation = calculate_orientation(scene)
+    rotation = mapping_node_order_flip(orientation)
+
+    if pg.is_enabled:
+        pg.orientation = rotation.to_matrix().inverted().to_4x4()
+
+        if pg.backend == 'CPU':
+            preview_cpu.update_preview(scene, pg.orientation)
+
+    if not tex_env: return
+
+    if bpy.app.version <= (2, 73, 4):
+        rotation = orientation
+
+    # every write tags the world, and re-syncs a rendered viewport
+    mapping = tex_env.texture_mapping
+    if any(abs(a - b) > ROTATION_EPSILON for a, b in zip(mapping.rotation, rotation)):
+        mapping.rotation = rotation
+
+
+def get_environment_texture(scene):
+    """return the Panorama Environment Texture node of the scene world, or None"""
     world = scene.world
-    if not world: return
+    if not world: return None
 
     nodetree = world.node_tree
-    if not nodetree or not nodetree.nodes: return
+    if not nodetree: return None
 
-    tex_env=nodetree.nodes.get("Panorama Environment Texture")
-    if not tex_env: return
+    return nodetree.nodes.get("Panorama Environment Texture")
 
-    if orientation == None:
-        orientation = calculate_orientation(scene)
 
-    if bpy.app.version <= (2, 73, 4):
-        tex_env.texture_mapping.rotation = orientation
-    else:
-        tex_env.texture_mapping.rotation = mapping_node_order_flip(orientation)
+@persistent
+def panorama_bake_load_post(dummy):
+    bake.invalidate()
+    _data_errors.clear()
 
 
 def mapping_node_order_flip(orientation):
@@ -475,10 +715,7 @@ def mapping_node_order_flip(orientation):
     Flip euler order of mapping shader node
     see: Blender #a1ffb49
     """
-    rot = Euler(orientation)
-    rot.order = 'ZYX'
-    quat = rot.to_quaternion()
-    return quat.to_euler('XYZ')
+    return Euler(geometry.mapping_node_order_flip(orientation))
 
 
 # ###############################
@@ -487,10 +724,126 @@ def mapping_node_order_flip(orientation):
 
 class TrackingPanoramaSettings(bpy.types.PropertyGroup):
     orientation= FloatVectorProperty(name="Orientation", description="Euler rotation", subtype='EULER', default=(0.0,0.0,0.0), update=update_orientation)
-    focus = StringProperty()
-    target = StringProperty()
-    flip = BoolProperty(default=True)
+    focus = StringProperty(update=update_bake)
+    target = StringProperty(update=update_bake)
+    flip = BoolProperty(default=True, update=update_bake)
+    use_keyframes = BoolProperty(default=False, name="Use Keyframes", description="The orientation is keyed (see Bake Keyframes), the frame change handler leaves the mapping node alone")
+    data_filepath = StringProperty(name="Stabilization Data", description="Use the orientations of this file (see Save Stabilization Data) instead of the tracks", subtype='FILE_PATH', update=update_bake)
+    bake_orientation = BoolProperty(default=False, name="Bake Orientation", description="Use a per-frame orientation table instead of evaluating the tracks every frame", update=update_bake)
     show_preview = BoolProperty(default=False, name="Show Preview", update=show_preview_update)
+    preview_quality = EnumProperty(
+            name="Preview Quality",
+            description="Resolution the preview is reprojected at",
+            items=(('FULL', "Full", "Reproject at the resolution of the clip editor"),
+                   ('HALF', "1/2", "Reproject at half the resolution"),
+                   ('QUARTER', "1/4", "Reproject at a quarter of the resolution"),
+                   ('INTERACTIVE', "Interactive", "Quarter resolution during playback and scrubbing, full resolution when idle"),
+                   ),
+            default='FULL',
+            )
+    preview_backend = EnumProperty(
+            name="Preview Backend",
+            description="How the preview is drawn",
+            items=(('AUTO', "Automatic", "OpenGL when available, the CPU otherwise"),
+                   ('GPU', "OpenGL", "Reproject the clip editor with a shader"),
+                   ('CPU', "CPU", "Reproject a downscaled frame into the '" + preview_cpu.PREVIEW_IMAGE + "' image"),
+                   ),
+            default='AUTO',
+            update=preview_backend_update,
+            )
+    yaw_tolerance = FloatProperty(name="Yaw Tolerance", description="Frames that are a rotation around the vertical axis up to this many pixels are only shifted horizontally by the CPU renderer (negative to disable)", default=0.5, min=-1.0, soft_max=4.0)
+
+
+class PanoramaTrackerPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    frame_cache_budget = IntProperty(name="Frame Cache (MB)", description="Memory used to keep decoded frames of the image sequence (frames read from the raw frame cache are memory-mapped and not counted, the next frames are only decoded ahead with Pillow installed)", default=512, min=16)
+    use_raw_cache = BoolProperty(name="Raw Frame Cache", description="Keep decoded frames on disk so later passes over the same sequence skip decoding", default=False)
+    raw_cache_directory = StringProperty(name="Directory", description="Folder of the raw frame cache, a temporary folder if empty", subtype='DIR_PATH')
+    raw_cache_size = IntProperty(name="Size (GB)", description="Maximum size of the raw frame cache", default=8, min=1)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "frame_cache_budget")
+
+        from .frames import can_load_threaded, PILLOW_MISSING
+        if not can_load_threaded():
+            layout.label(text="Frames are not decoded ahead, " + PILLOW_MISSING, icon='INFO')
+
+        layout.prop(self, "use_raw_cache")
+        col = layout.column()
+        col.active = self.use_raw_cache
+        col.prop(self, "raw_cache_directory")
+        col.prop(self, "raw_cache_size")
+        col.operator("clip.panorama_purge_raw_cache")
+
+
+def get_preferences(context):
+    """return the addon preferences"""
+    return context.user_preferences.addons[__package__].preferences
+
+
+def get_raw_store(context, force=False):
+    """return the RawFrameStore set in the preferences, None if disabled"""
+    from .framestore import RawFrameStore
+
+    preferences = get_preferences(context)
+    if not preferences.use_raw_cache and not force:
+        return None
+
+    directory = bpy.path.abspath(preferences.raw_cache_directory) if preferences.raw_cache_directory else None
+    return RawFrameStore(directory, preferences.raw_cache_size * 1024 * 1024 * 1024)
+
+
+class CLIP_OT_panorama_purge_raw_cache(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_purge_raw_cache"
+    bl_label = "Purge Raw Frame Cache"
+    bl_description = "Remove all the decoded frames kept on disk"
+    bl_options = {'REGISTER'}
+
+    @profiling.timed_method("clip.panorama_purge_raw_cache")
+    def execute(self, context):
+        size = get_raw_store(context, force=True).purge()
+        self.report({'INFO'}, "Freed {0:.1f} MB".format(size / 1048576.0))
+        return {'FINISHED'}
+
+
+class CLIP_OT_panorama_profile_dump(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_profile_dump"
+    bl_label = "Save Profile"
+    bl_description = "Write the timings of the addon entry points to a json file"
+    bl_options = {'REGISTER'}
+
+    filepath = StringProperty(subtype='FILE_PATH')
+    filter_glob = StringProperty(default="*.json", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "panorama_profile.json"
+
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        filepath = bpy.path.abspath(self.filepath)
+        profiling.dump(filepath)
+
+        self.report({'INFO'}, "Profile saved to {0}".format(filepath))
+        return {'FINISHED'}
+
+
+class CLIP_OT_panorama_profile_reset(bpy.types.Operator):
+    """"""
+    bl_idname = "clip.panorama_profile_reset"
+    bl_label = "Reset Profile"
+    bl_description = "Clear the timings of the addon entry points"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        profiling.reset()
+        return {'FINISHED'}
 
 
 # ###############################
@@ -498,29 +851,54 @@ class TrackingPanoramaSettings(bpy.types.PropertyGroup):
 # ###############################
 
 def register():
+    bpy.utils.register_class(PanoramaTrackerPreferences)
+    bpy.utils.register_class(CLIP_OT_panorama_purge_raw_cache)
     bpy.utils.register_class(TrackingPanoramaSettings)
     bpy.utils.register_class(CLIP_OT_panorama_reset)
     bpy.utils.register_class(CLIP_OT_panorama_target)
     bpy.utils.register_class(CLIP_OT_panorama_camera)
     bpy.utils.register_class(CLIP_OT_panorama_focus)
+    bpy.utils.register_class(CLIP_OT_panorama_bake)
+    bpy.utils.register_class(CLIP_OT_panorama_keyframes)
+    bpy.utils.register_class(CLIP_OT_panorama_save_data)
+    bpy.utils.register_class(CLIP_OT_panorama_profile_dump)
+    bpy.utils.register_class(CLIP_OT_panorama_profile_reset)
 
     bpy.types.MovieClip.panorama_settings = PointerProperty(
             type=TrackingPanoramaSettings, name="Tracking Panorama Settings", description="")
 
     bpy.types.Scene.panorama_movieclip = StringProperty()
 
+    bpy.types.WindowManager.panorama_profiling = BoolProperty(
+            name="Profiling", description="Time the handlers, the preview drawing and the operators of the addon",
+            get=lambda self: profiling.is_enabled(), set=lambda self, value: profiling.enable(value))
+
+    profiling.start_cprofile()
+
     bpy.app.handlers.frame_change_post.append(update_panorama_orientation)
+    bpy.app.handlers.load_post.append(panorama_bake_load_post)
 
 
 def unregister():
 
     del bpy.types.MovieClip.panorama_settings
     del bpy.types.Scene.panorama_movieclip
+    del bpy.types.WindowManager.panorama_profiling
+
+    profiling.stop_cprofile()
 
     bpy.app.handlers.frame_change_post.remove(update_panorama_orientation)
+    bpy.app.handlers.load_post.remove(panorama_bake_load_post)
 
+    bpy.utils.unregister_class(CLIP_OT_panorama_profile_reset)
+    bpy.utils.unregister_class(CLIP_OT_panorama_profile_dump)
+    bpy.utils.unregister_class(CLIP_OT_panorama_save_data)
+    bpy.utils.unregister_class(CLIP_OT_panorama_keyframes)
+    bpy.utils.unregister_class(CLIP_OT_panorama_bake)
     bpy.utils.unregister_class(CLIP_OT_panorama_focus)
     bpy.utils.unregister_class(CLIP_OT_panorama_camera)
     bpy.utils.unregister_class(CLIP_OT_panorama_target)
-    bpy.utils.unregister_class(CLIP_OT_panorama_unreset)
+    bpy.utils.unregister_class(CLIP_OT_panorama_reset)
     bpy.utils.unregister_class(TrackingPanoramaSettings)
+    bpy.utils.unregister_class(CLIP_OT_panorama_purge_raw_cache)
+    bpy.utils.unregister_class(PanoramaTrackerPreferences)
@@ -0,0 +1,316 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Parallel export of the stabilized frames
+
+The frame range is split in chunks of consecutive frames which are
+stabilized in a pool of worker processes. The workers get the solved
+orientation matrices with the jobs, they never evaluate the tracking, and
+run in plain Python (they need numpy and Pillow).
+
+Command line, from the folder with the addon:
+    blender -b shot.blend --python-expr "from movie_clip_editor_panorama_tracker import export; export.main()" -- --workers 16
+
+With a stabilization data file (see Save Stabilization Data) a render node
+needs neither Blender nor the .blend, and only reads the frames of its chunk:
+    python -m movie_clip_editor_panorama_tracker.export --data shot.ptstab --frames 1-40 --output /out/frame_####.png
+"""
+
+import multiprocessing
+import sys
+import time
+
+from . import frames
+from . import profiling
+from . import reproject
+from . import stabilization
+from .render import data_frame_jobs, render_frames
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+# ###############################
+# Workers
+# ###############################
+
+def _render_chunk(args):
+    """worker: stabilize a chunk of frames, return (frame, seconds, yaw fast path) for each"""
+    jobs, width, height, yaw_tolerance, raw_store = args
+
+    results = []
+    yaw_frames = [reproject.stats.yaw_frames]
+
+    def report(job, seconds):
+        results.append((job.frame, seconds, reproject.stats.yaw_frames != yaw_frames[0]))
+        yaw_frames[0] = reproject.stats.yaw_frames
+
+    render_frames(jobs, width, height, None, report, yaw_tolerance, threads=1, raw_store=raw_store)
+    return results
+
+
+def split_chunks(jobs, chunk_size):
+    """split the jobs in lists of consecutive frames"""
+    jobs = sorted(jobs, key=lambda job: job.frame)
+    return [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+
+class ExportStats:
+    """throughput of an export"""
+
+    def __init__(self):
+        self.frames = 0
+        self.yaw_frames = 0
+        self.seconds = 0.0
+
+    @property
+    def fps(self):
+        return self.frames / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return "{0} frames in {1:.1f}s ({2:.2f} fps), {3} took the yaw fast path".format(
+                self.frames, self.seconds, self.fps, self.yaw_frames)
+
+
+def export_frames(jobs, workers=0, chunk_size=4, width=None, height=None,
+                  yaw_tolerance=reproject.YAW_TOLERANCE, report=None, raw_store=None):
+    """
+    stabilize the jobs in a process pool, return the ExportStats
+    workers : number of processes, 0 for one per cpu
+    report : optional function(frame, seconds) called in frame order, the
+             time is also kept in the "export_frame" profiling timer
+    raw_store : optional framestore.RawFrameStore shared by the workers
+    """
+    # the workers cannot use bpy to read and write the images
+    frames.require_pillow("Exporting in worker processes")
+
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+
+    chunks = split_chunks(jobs, max(1, chunk_size))
+    stats = ExportStats()
+    start = time.time()
+
+    context = multiprocessing.get_context('spawn')
+
+    if bpy:
+        # sys.executable is Blender itself, the workers run in its bundled Python
+        context.set_executable(bpy.app.binary_path_python)
+
+    pool = context.Pool(min(workers, len(chunks)) or 1)
+    try:
+        args = [(chunk, width, height, yaw_tolerance, raw_store) for chunk in chunks]
+
+        for results in pool.imap(_render_chunk, args):
+            for frame, seconds, yaw in results:
+                stats.frames += 1
+                stats.yaw_frames += yaw
+
+                if profiling.is_enabled():
+                    profiling.get_timer("export_frame").add(seconds)
+
+                if report:
+                    report(frame, seconds)
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    stats.seconds = time.time() - start
+    return stats
+
+
+# ###############################
+# Operators
+# ###############################
+
+if bpy:
+    from bpy.props import IntProperty
+
+    from .render import scene_frame_jobs, scene_resolution
+
+    class CLIP_OT_panorama_export(bpy.types.Operator):
+        """"""
+        bl_idname = "clip.panorama_export"
+        bl_label = "Export Stabilized"
+        bl_description = "Write the stabilized frames to the render output using several processes (needs Pillow)"
+        bl_options = {'REGISTER'}
+
+        workers = IntProperty(name="Workers", description="Number of processes, 0 for one per CPU", default=0, min=0)
+        chunk_size = IntProperty(name="Chunk Size", description="Consecutive frames sent to a process at once", default=4, min=1)
+
+        @classmethod
+        def poll(cls, context):
+            scene = context.scene
+            movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+            return movieclip and movieclip.source == 'SEQUENCE'
+
+        def invoke(self, context, event):
+            return context.window_manager.invoke_props_dialog(self)
+
+        def execute(self, context):
+            scene = context.scene
+            movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+
+            from .core import get_raw_store
+
+            if not frames.can_load_threaded():
+                self.report({'ERROR'}, "Export Stabilized needs Pillow, use Render Stabilized (CPU) instead: " +
+                            frames.PILLOW_MISSING)
+                return {'CANCELLED'}
+
+            try:
+                stats = export_scene(scene, movieclip, self.workers, self.chunk_size, get_raw_store(context))
+            except Exception as E:
+                self.report({'ERROR'}, "Export failed: {0}".format(E))
+                return {'CANCELLED'}
+
+            self.report({'INFO'}, str(stats))
+            return {'FINISHED'}
+
+
+def export_scene(scene, movieclip, workers=0, chunk_size=4, raw_store=None, report=None):
+    """export all the frames of the scene, return the ExportStats"""
+    jobs = scene_frame_jobs(scene, movieclip)
+    width, height = scene_resolution(scene)
+
+    return export_frames(jobs, workers, chunk_size, width, height,
+                         movieclip.panorama_settings.yaw_tolerance, report, raw_store)
+
+
+def export_data(data, output, frame_start=None, frame_end=None, source=None, workers=0, chunk_size=4,
+                width=None, height=None, yaw_tolerance=reproject.YAW_TOLERANCE, raw_store=None, report=None):
+    """export frames of a stabilization.StabilizationData, return the ExportStats"""
+    if frame_start is None:
+        frame_start = data.frame_start
+
+    if frame_end is None:
+        frame_end = data.frame_end
+
+    jobs = data_frame_jobs(data, frame_start, frame_end, output, source)
+
+    return export_frames(jobs, workers, chunk_size, width or data.width or None, height or data.height or None,
+                         yaw_tolerance, report, raw_store)
+
+
+# ###############################
+# Command Line
+# ###############################
+
+def print_frame(frame, seconds):
+    """command line progress"""
+    print("Panorama Tracker: frame {0} stabilized in {1:.3f}s".format(frame, seconds))
+
+
+def parse_frame_range(value):
+    """return (start, end) of a 'START-END' or 'FRAME' argument"""
+    import argparse
+
+    try:
+        start, sep, end = value.partition('-')
+        start = int(start)
+        return start, int(end) if sep else start
+    except ValueError:
+        raise argparse.ArgumentTypeError("'{0}' is not a frame range (START-END)".format(value))
+
+
+def main(argv=None):
+    """command line entry point, inside Blender the arguments are the ones after '--'"""
+    import argparse
+
+    if argv is None:
+        if '--' in sys.argv:
+            argv = sys.argv[sys.argv.index('--') + 1:]
+        else:
+            argv = [] if bpy else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Export the stabilized panorama frames of a .blend or a stabilization data file")
+    parser.add_argument("--scene", help="scene to export, defaults to the active one")
+    parser.add_argument("--data", metavar="FILE", help="stabilization data file, exports without Blender and the .blend")
+    parser.add_argument("--source", help="image sequence path, replaces the one stored in the stabilization data")
+    parser.add_argument("--frames", metavar="START-END", type=parse_frame_range, help="frames to export, defaults to all of them")
+    parser.add_argument("--width", type=int, help="output width, defaults to the one of the stabilization data")
+    parser.add_argument("--height", type=int, help="output height, defaults to the one of the stabilization data")
+    parser.add_argument("--yaw-tolerance", type=float, default=reproject.YAW_TOLERANCE, help="pixels of the yaw fast path, negative to disable")
+    parser.add_argument("--workers", type=int, default=0, help="number of processes, 0 for one per CPU")
+    parser.add_argument("--chunk-size", type=int, default=4, help="consecutive frames per task")
+    parser.add_argument("--output", help="output path, '#' for the frame number, defaults to the scene render output")
+    parser.add_argument("--raw-cache", metavar="DIRECTORY", help="keep decoded frames in this folder for later runs")
+    args = parser.parse_args(argv)
+
+    raw_store = None
+    if args.raw_cache:
+        from .framestore import RawFrameStore
+        raw_store = RawFrameStore(args.raw_cache)
+
+    frame_start, frame_end = args.frames or (None, None)
+
+    if args.data:
+        if not args.output:
+            parser.error("--output is required with --data")
+
+        try:
+            data = stabilization.load(args.data)
+        except (IOError, OSError, ValueError) as E:
+            parser.error(str(E))
+
+        stats = export_data(data, args.output, frame_start, frame_end, args.source, args.workers, args.chunk_size,
+                            args.width, args.height, args.yaw_tolerance, raw_store, print_frame)
+        print("Panorama Tracker: {0}".format(stats))
+        return
+
+    if not bpy:
+        parser.error("this command needs to run inside Blender (blender -b file.blend --python-expr ...) or --data")
+
+    scene = bpy.data.scenes[args.scene] if args.scene else bpy.context.scene
+    movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+
+    if not movieclip:
+        parser.error("scene '{0}' has no panorama movieclip, run 'Panorama Camera' first".format(scene.name))
+
+    if args.output:
+        scene.render.filepath = args.output
+
+    if args.frames:
+        scene.frame_start = frame_start
+        scene.frame_end = frame_end
+
+    stats = export_scene(scene, movieclip, args.workers, args.chunk_size, raw_store, print_frame)
+    print("Panorama Tracker: {0}".format(stats))
+
+
+# ###############################
+#  Register / Unregister
+# ###############################
+
+def register():
+    bpy.utils.register_class(CLIP_OT_panorama_export)
+
+
+def unregister():
+    bpy.utils.unregister_class(CLIP_OT_panorama_export)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Reading and writing of the image sequence frames
+
+Frames are (H,W,3) uint8 arrays with the bottom row first. Frames are
+decoded with Pillow when it is available, inside Blender bpy is used
+otherwise (bpy can only be used from the main thread).
+"""
+
+import os
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# ###############################
+# Image Sequence
+# ###############################
+
+def split_sequence_filepath(filepath):
+    """return the head, number and tail of a sequence filepath, number is None if there is none"""
+    folder, file = os.path.split(filepath)
+    name, ext = os.path.splitext(file)
+
+    end = len(name)
+    while end > 0 and not name[end - 1].isdigit():
+        end -= 1
+
+    start = end
+    while start > 0 and name[start - 1].isdigit():
+        start -= 1
+
+    if start == end:
+        return filepath, None, ""
+
+    head = os.path.join(folder, name[:start])
+    return head, name[start:end], name[end:] + ext
+
+
+def sequence_filepath(filepath, number):
+    """return the filepath of another frame of the sequence, keeping the zero padding"""
+    head, digits, tail = split_sequence_filepath(filepath)
+
+    if digits is None:
+        return filepath
+
+    return "{0}{1:0{2}d}{3}".format(head, number, len(digits), tail)
+
+
+def frame_output_path(pattern, frame):
+    """return the output file of the frame, '#' are replaced by the zero padded frame number (appended if there are none)"""
+    folder, file = os.path.split(pattern)
+
+    if '#' not in file:
+        name, ext = os.path.splitext(file)
+        file = name + "####" + (ext or ".png")
+
+    start = file.index('#')
+    end = start
+    while end < len(file) and file[end] == '#':
+        end += 1
+
+    return os.path.join(folder, "{0}{1:0{2}d}{3}".format(file[:start], frame, end - start, file[end:]))
+
+
+# ###############################
+# Reading and Writing
+# ###############################
+
+def load_frame(filepath):
+    """return the (H,W,3) uint8 pixels of an image file"""
+    if Image is None and bpy:
+        return _load_frame_bpy(filepath)
+
+    if Image is None:
+        raise ImportError("Pillow is required to read images outside of Blender")
+
+    image = Image.open(filepath).convert('RGB')
+    return np.ascontiguousarray(np.asarray(image, dtype=np.uint8)[::-1])
+
+
+def can_load_threaded():
+    """whether load_frame can be called from a background thread"""
+    return Image is not None
+
+
+# Blender does not bundle Pillow, it goes in its Python (python -m pip install Pillow)
+PILLOW_MISSING = "Pillow is not installed (inside Blender, in the Python it bundles)"
+
+
+def require_pillow(what):
+    """raise an ImportError saying what needs Pillow when it is not installed"""
+    if Image is None:
+        raise ImportError("{0} needs Pillow: {1}".format(what, PILLOW_MISSING))
+
+
+def save_frame(filepath, pixels, scene=None):
+    """
+    write (H,W,3) uint8 pixels to an image file
+    scene : inside Blender the scene render settings define the file format
+    """
+    folder = os.path.dirname(filepath)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    if bpy:
+        _save_frame_bpy(filepath, pixels, scene)
+        return
+
+    if Image is None:
+        raise ImportError("Pillow is required to write images outside of Blender")
+
+    Image.fromarray(np.ascontiguousarray(pixels[::-1])).save(filepath)
+
+
+def _load_frame_bpy(filepath):
+    image = bpy.data.images.load(filepath)
+
+    try:
+        width, height = image.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(image)
+
+    pixels = pixels.reshape(height, width, 4)[..., :3]
+    return (pixels * 255.0 + 0.5).astype(np.uint8)
+
+
+def _save_frame_bpy(filepath, pixels, scene):
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new("Panorama Stabilized", width, height)
+
+    try:
+        rgba = np.ones((height, width, 4), dtype=np.float32)
+        rgba[..., :3] = pixels[..., :3] / 255.0
+        image.pixels.foreach_set(rgba.ravel())
+
+        if scene:
+            image.save_render(filepath, scene)
+        else:
+            image.filepath_raw = filepath
+            image.save()
+    finally:
+        bpy.data.images.remove(image)
+
+
+# ###############################
+# Frame Cache
+# ###############################
+
+class FrameCacheStats:
+    """hits and misses of a FrameCache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self):
+        return "{0} hits, {1} misses ({2:.0%}), {3} prefetched, {4} evicted".format(
+                self.hits, self.misses, self.hit_rate, self.prefetched, self.evictions)
+
+
+def frame_size(pixels):
+    """bytes the frame holds in memory, memory-mapped frames are paged by the OS"""
+    return 0 if isinstance(pixels, np.memmap) else pixels.nbytes
+
+
+class FrameCache:
+    """
+    decoded frames of an image sequence, least recently used frames are
+    evicted once the byte budget is reached
+
+    a background thread decodes the next frames in the direction the
+    frames are requested in (only when load_frame is thread safe)
+
+    filepath : function(frame) returning the file of the frame, or None
+    budget : maximum size of the decoded frames, in bytes, memory-mapped frames
+             (framestore.RawFrameStore) are paged by the OS and not counted
+    prefetch : number of frames decoded ahead
+    max_frames : maximum number of frames kept, bounds the open memory maps
+    """
+
+    def __init__(self, filepath, budget=512 * 1024 * 1024, prefetch=8, loader=load_frame, max_frames=1024):
+        self.filepath = filepath
+        self.budget = budget
+        self.max_frames = max_frames
+        self.prefetch = prefetch if can_load_threaded() else 0
+        self.loader = loader
+        self.stats = FrameCacheStats()
+
+        self._frames = OrderedDict()
+        self._size = 0
+        self._last_frame = None
+        self._direction = 1
+
+        self._lock = threading.Condition()
+        self._queue = []
+        self._loading = set()
+        self._thread = None
+        self._running = True
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __str__(self):
+        return "{0} frames, {1:.0f}/{2:.0f} MB, {3}".format(
+                len(self), self._size / 1048576.0, self.budget / 1048576.0, self.stats)
+
+    def get(self, frame):
+        """return the pixels of the frame, decoding it if needed"""
+        with self._lock:
+            self._update_direction(frame)
+
+            while frame in self._loading:
+                self._lock.wait()
+
+            pixels = self._frames.get(frame)
+            if pixels is not None:
+                self._frames.move_to_end(frame)
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                self._loading.add(frame)
+
+        if pixels is None:
+            try:
+                pixels = self.loader(self.filepath(frame))
+            finally:
+                with self._lock:
+                    self._loading.discard(frame)
+                    self._lock.notify_all()
+
+            with self._lock:
+                self._store(frame, pixels)
+
+        self._schedule(frame)
+        return pixels
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._size = 0
+
+    def close(self):
+        """stop the prefetch thread"""
+        with self._lock:
+            self._running = False
+            self._queue = []
+            self._lock.notify_all()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _update_direction(self, frame):
+        if self._last_frame is not None and frame != self._last_frame:
+            self._direction = 1 if frame > self._last_frame else -1
+        self._last_frame = frame
+
+    def _store(self, frame, pixels):
+        if frame in self._frames:
+            return
+
+        self._frames[frame] = pixels
+        self._size += frame_size(pixels)
+
+        while (self._size > self.budget or len(self._frames) > self.max_frames) and len(self._frames) > 1:
+            old_frame, old_pixels = self._frames.popitem(last=False)
+            self._size -= frame_size(old_pixels)
+            self.stats.evictions += 1
+
+    def _schedule(self, frame):
+        if not self.prefetch:
+            return
+
+        with self._lock:
+            # the newest request replaces the pending prefetches
+            self._queue = [frame + self._direction * i for i in range(1, self.prefetch + 1)]
+            self._lock.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._prefetch_loop, name="Panorama Frame Prefetch")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._lock:
+                while self._running and not self._queue:
+                    self._lock.wait()
+
+                if not self._running:
+                    return
+
+                frame = self._queue.pop(0)
+                if frame in self._frames or frame in self._loading:
+                    continue
+
+                filepath = self.filepath(frame)
+                if not filepath or not os.path.exists(filepath):
+                    continue
+
+                self._loading.add(frame)
+
+            pixels = None
+            try:
+                pixels = self.loader(filepath)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._loading.discard(frame)
+                    if pixels is not None:
+                        self._store(frame, pixels)
+                        self.stats.prefetched += 1
+                    self._lock.notify_all()
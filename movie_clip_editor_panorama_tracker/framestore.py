@@ -0,0 +1,213 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+On-disk store of decoded frames
+
+Every source file is decoded once into a raw uint8 file (a small header
+followed by the (H,W,C) pixels), named after the source path, size and
+modification time. Later reads memory-map the raw file, no decoding and
+no copy.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+from . import frames
+
+MAGIC = b'PTRAW\x00\x01\x00'
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 32
+
+DEFAULT_SIZE = 8 * 1024 * 1024 * 1024
+
+
+def default_directory():
+    """PANORAMA_TRACKER_RAW_CACHE or a folder in the temporary directory"""
+    return os.environ.get("PANORAMA_TRACKER_RAW_CACHE") or \
+        os.path.join(tempfile.gettempdir(), "panorama_tracker_raw")
+
+
+class RawFrameStore:
+    """
+    directory : where the raw files are written
+    max_size : total size of the raw files in bytes, the least recently
+               used files are removed past it
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_SIZE, loader=frames.load_frame):
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        self.loader = loader
+
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # sent to the export workers
+        return (self.directory, self.max_size, self.loader)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def raw_filepath(self, filepath):
+        """return the raw file for the current version of the source file"""
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+
+        key = "{0}|{1}|{2}".format(filepath, stat.st_size, stat.st_mtime_ns)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + ".raw")
+
+    def load(self, filepath):
+        """return the (H,W,C) uint8 pixels of the source file, memory-mapped"""
+        raw_filepath = self.raw_filepath(filepath)
+
+        pixels = self._open(raw_filepath)
+        if pixels is not None:
+            return pixels
+
+        pixels = self.loader(filepath)
+        self._write(raw_filepath, pixels)
+        return pixels
+
+    def _open(self, raw_filepath):
+        try:
+            with open(raw_filepath, 'rb') as f:
+                magic, height, width, channels = HEADER.unpack(f.read(HEADER.size))
+        except (IOError, OSError, struct.error):
+            return None
+
+        if magic != MAGIC:
+            return None
+
+        try:
+            pixels = np.memmap(raw_filepath, dtype=np.uint8, mode='r', offset=HEADER_SIZE,
+                               shape=(height, width, channels))
+        except (ValueError, OSError):
+            # truncated or from another version, decoded again
+            self._remove(raw_filepath)
+            return None
+
+        # mark as recently used
+        os.utime(raw_filepath, None)
+        return pixels
+
+    def _remove(self, raw_filepath):
+        try:
+            size = os.path.getsize(raw_filepath)
+            os.remove(raw_filepath)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _write(self, raw_filepath, pixels):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+        height, width, channels = pixels.shape
+        header = HEADER.pack(MAGIC, height, width, channels).ljust(HEADER_SIZE, b'\x00')
+
+        # write aside and rename, readers never see a partial file
+        fd, temp_filepath = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(np.ascontiguousarray(pixels, dtype=np.uint8).tobytes())
+        os.replace(temp_filepath, raw_filepath)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += HEADER_SIZE + pixels.nbytes
+
+            if self._size > self.max_size:
+                self._size = self._evict(raw_filepath)
+
+    def _files(self):
+        """return (mtime, size, filepath) of the raw files"""
+        files = []
+
+        if not os.path.isdir(self.directory):
+            return files
+
+        for name in os.listdir(self.directory):
+            if not name.endswith(".raw"):
+                continue
+
+            filepath = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, filepath))
+
+        return files
+
+    def _evict(self, keep):
+        """remove the least recently used files until under max_size, return the new size"""
+        files = sorted(self._files())
+        size = sum(file[1] for file in files)
+
+        for mtime, file_size, filepath in files:
+            if size <= self.max_size:
+                break
+
+            if filepath == keep:
+                continue
+
+            try:
+                os.remove(filepath)
+            except OSError:
+                continue
+
+            size -= file_size
+
+        return size
+
+    def size(self):
+        """total size of the raw files, in bytes"""
+        return sum(file[1] for file in self._files())
+
+    def purge(self):
+        """remove all the raw files, return how many bytes were freed"""
+        size = 0
+
+        for mtime, file_size, filepath in self._files():
+            try:
+                os.remove(filepath)
+            except OSError:
+                continue
+
+            size += file_size
+
+        with self._lock:
+            self._size = 0
+
+        return size
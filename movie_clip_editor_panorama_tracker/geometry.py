@@ -0,0 +1,182 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Spherical geometry and orientation solving of a single frame
+
+Only uses the standard library, so it can be imported by worker
+processes, render nodes and tests without Blender. Vectors are (x,y,z)
+tuples, matrices tuples of rows, the same layout as mathutils.Matrix.
+core.py wraps these functions for mathutils, solver.py is the NumPy
+version working on all the frames at once.
+"""
+
+from math import (
+        atan2,
+        cos,
+        hypot,
+        pi,
+        sin,
+        sqrt,
+        )
+
+# same threshold mathutils uses to detect gimbal lock
+FLT_EPSILON = 1.1920928955078125e-07
+
+
+# ###############################
+#  Vector Functions
+# ###############################
+
+def cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def normalize(vector):
+    """return the unit vector, a zero length vector is left untouched"""
+    length = sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+    if length == 0.0:
+        return tuple(vector)
+
+    return (vector[0] / length, vector[1] / length, vector[2] / length)
+
+
+def multiply(a, b):
+    """product of two 3x3 matrices"""
+    b0, b1, b2 = b
+    return tuple(
+            (row[0] * b0[0] + row[1] * b1[0] + row[2] * b2[0],
+             row[0] * b0[1] + row[1] * b1[1] + row[2] * b2[1],
+             row[0] * b0[2] + row[1] * b1[2] + row[2] * b2[2])
+            for row in a)
+
+
+def transpose(matrix):
+    return tuple(zip(*matrix))
+
+
+# ###############################
+#  Geometry Functions
+# ###############################
+
+def equirectangular_to_sphere(uv):
+    """
+    convert a 2d point to 3d
+    uv : 0,0 (bottom left) 1,1 (top right)
+    uv : +pi, -pi/2 (bottom left) -pi, +pi/2 (top right)
+    """
+    u, v = uv
+
+    phi = (0.5 - u) * 2 * pi
+    theta = (v - 0.5) * pi
+    r = cos(theta)
+
+    return (cos(phi) * r, sin(phi) * r, sin(theta))
+
+
+def euler_to_matrix(euler, order='XYZ'):
+    """euler rotation to 3x3 matrix, as Euler(euler, order).to_matrix(), order is 'XYZ' or 'ZYX'"""
+    cx, cy, cz = cos(euler[0]), cos(euler[1]), cos(euler[2])
+    sx, sy, sz = sin(euler[0]), sin(euler[1]), sin(euler[2])
+
+    # the first axis of the order is applied first
+    if order == 'XYZ':
+        # Rz * Ry * Rx
+        return ((cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz),
+                (cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz),
+                (-sy, sx * cy, cx * cy))
+    elif order == 'ZYX':
+        # Rx * Ry * Rz
+        return ((cy * cz, -cy * sz, sy),
+                (sx * sy * cz + cx * sz, cx * cz - sx * sy * sz, -sx * cy),
+                (sx * sz - cx * sy * cz, cx * sy * sz + sx * cz, cx * cy))
+
+    raise ValueError("unsupported euler order '{0}'".format(order))
+
+
+def matrix_to_euler(matrix):
+    """
+    3x3 matrix to XYZ euler rotation, as Matrix.to_euler()
+    of the two possible solutions the one with the smallest angles is used
+    """
+    # mathutils normalizes the columns first
+    m00, m10, m20 = normalize((matrix[0][0], matrix[1][0], matrix[2][0]))
+    m01, m11, m21 = normalize((matrix[0][1], matrix[1][1], matrix[2][1]))
+    m02, m12, m22 = normalize((matrix[0][2], matrix[1][2], matrix[2][2]))
+
+    cy = hypot(m00, m10)
+
+    if cy <= 16.0 * FLT_EPSILON:
+        return (atan2(-m12, m11), atan2(-m20, cy), 0.0)
+
+    eul1 = (atan2(m21, m22), atan2(-m20, cy), atan2(m10, m00))
+    eul2 = (atan2(-m21, -m22), atan2(-m20, -cy), atan2(-m10, -m00))
+
+    if sum(abs(a) for a in eul1) > sum(abs(a) for a in eul2):
+        return eul2
+
+    return eul1
+
+
+def sphere_to_euler(vecx, vecy, vecz):
+    """
+    convert sphere orientation vectors to euler
+    """
+    return matrix_to_euler((tuple(vecx), tuple(vecy), tuple(vecz)))
+
+
+def mapping_node_order_flip(orientation):
+    """
+    Flip euler order of mapping shader node
+    see: Blender #a1ffb49
+    """
+    return matrix_to_euler(euler_to_matrix(orientation, 'ZYX'))
+
+
+# ###############################
+# Main function
+# ###############################
+
+def solve_orientation(focus, target, flip, reference=(0.0, 0.0, 0.0)):
+    """
+    return the orientation of a single frame, as core.calculate_orientation
+    focus, target : marker coordinates of the focus and target tracks
+    flip : settings.flip
+    reference : settings.orientation, XYZ euler
+    """
+    vecx = equirectangular_to_sphere(focus)
+    vecy = equirectangular_to_sphere(target)
+
+    if flip:
+        vecz = cross(vecx, vecy)
+    else:
+        vecz = cross(vecy, vecx)
+    vecz = normalize(vecz)
+
+    # retarget y axis again
+    nvecy = normalize(cross(vecz, vecx))
+
+    # store orientation
+    matrix = multiply(euler_to_matrix(reference), (vecx, nvecy, vecz))
+    orientation = matrix_to_euler(matrix)
+
+    return (-orientation[0], -orientation[1], -orientation[2])
@@ -0,0 +1,122 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Per-frame orientation written as F-Curve keyframes
+
+Once keyed, the mapping node (or the camera) is animated by Blender
+itself and rendering does not need the frame change handler.
+"""
+
+import bpy
+
+from mathutils import (
+        Euler,
+        )
+
+NODE_ROTATION_PATH = 'nodes["Panorama Environment Texture"].texture_mapping.rotation'
+
+def remove_fcurves(id_data, data_path):
+    """remove the F-Curves of all the channels of the data path"""
+    animation_data = id_data.animation_data
+    if not animation_data or not animation_data.action:
+        return
+
+    fcurves = animation_data.action.fcurves
+    for fcurve in [fcurve for fcurve in fcurves if fcurve.data_path == data_path]:
+        fcurves.remove(fcurve)
+
+
+def set_fcurves(id_data, data_path, frames, values, interpolation='LINEAR', group=""):
+    """
+    replace the F-Curves of the data path by one keyframe per frame
+    values : one sequence of channel values per frame
+    """
+    animation_data = id_data.animation_data or id_data.animation_data_create()
+
+    if not animation_data.action:
+        animation_data.action = bpy.data.actions.new(id_data.name + "Action")
+
+    remove_fcurves(id_data, data_path)
+
+    fcurves = animation_data.action.fcurves
+    count = len(frames)
+
+    for index in range(len(values[0])):
+        fcurve = fcurves.new(data_path, index, group)
+
+        co = [0.0] * (count * 2)
+        co[0::2] = frames
+        co[1::2] = [value[index] for value in values]
+
+        # all the keyframes at once, no keyframe_insert per frame
+        points = fcurve.keyframe_points
+        points.add(count)
+        points.foreach_set("co", co)
+
+        # foreach_set only takes bool, int and float properties, interpolation is an enum
+        for point in points:
+            point.interpolation = interpolation
+
+        fcurve.update()
+
+
+def compatible_eulers(eulers):
+    """return the eulers without the 360 degree jumps, so they interpolate"""
+    result = []
+    previous = None
+
+    for euler in eulers:
+        euler = Euler(euler)
+        if previous is not None:
+            euler.make_compatible(previous)
+
+        result.append(tuple(euler))
+        previous = euler
+
+    return result
+
+
+def node_rotations(orientations):
+    """mapping node rotation of every orientation, as update_panorama_orientation sets it"""
+    from .core import mapping_node_order_flip
+
+    if bpy.app.version <= (2, 73, 4):
+        return compatible_eulers(orientations)
+
+    return compatible_eulers([mapping_node_order_flip(orientation) for orientation in orientations])
+
+
+def camera_rotations(orientations, camera_rotation):
+    """
+    camera rotation of every orientation, for a world with no mapping rotation
+    camera_rotation : the rest rotation of the camera (see CLIP_OT_panorama_camera)
+    """
+    rest = Euler(camera_rotation).to_matrix()
+    eulers = []
+
+    for orientation in orientations:
+        # the mapping node rotation, see mapping_node_order_flip
+        mapping = Euler(orientation, 'ZYX').to_matrix()
+
+        # rotating the rays by the camera is the same as rotating the lookup by the mapping
+        eulers.append((mapping * rest).to_euler())
+
+    return compatible_eulers(eulers)
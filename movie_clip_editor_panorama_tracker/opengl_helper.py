@@ -70,20 +70,6 @@ def print_program_errors(program):
 # OpenGL Image Routines
 # ######################
 
-def resize(self, context):
-    """we can run every frame or only when width/height change"""
-    # remove old textures
-    self.quit()
-
-    self.width = context.region.width
-    self.height = context.region.height
-
-    self.buffer_width, self.buffer_height = calculate_image_size(self.width, self.height)
-
-    # image to dump screen
-    self.color_id = create_image(self.buffer_width, self.buffer_height, GL_RGBA)
-
-
 def calculate_image_size(width, height):
     """get a power of 2 size"""
     buffer_width, buffer_height = 0,0
@@ -100,10 +86,10 @@ def calculate_image_size(width, height):
 
 
 def update_image(tex_id, viewport, target=GL_RGBA, texture=GL_TEXTURE0):
-    """copy the current buffer to the image"""
+    """copy the current buffer to the image, the image storage is reused"""
     glActiveTexture(texture)
     glBindTexture(GL_TEXTURE_2D, tex_id)
-    glCopyTexImage2D(GL_TEXTURE_2D, 0, target, viewport[0], viewport[1], viewport[2], viewport[3], 0)
+    glCopyTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, viewport[0], viewport[1], viewport[2], viewport[3])
     glBindTexture(GL_TEXTURE_2D, 0)
 
 
@@ -114,7 +100,9 @@ def create_image(width, height, target=GL_RGBA):
     else:
         target, internal_format, dimension = GL_DEPTH_COMPONENT32, GL_DEPTH_COMPONENT, 1
 
-    null_buffer = Buffer(GL_BYTE, [(width + 1) * (height + 1) * dimension])
+    # rows are read padded to GL_UNPACK_ALIGNMENT (4 by default)
+    stride = (width * dimension + 3) // 4 * 4
+    null_buffer = Buffer(GL_BYTE, [stride * height])
 
     id_buf = Buffer(GL_INT, 1)
     glGenTextures(1, id_buf)
@@ -129,8 +117,6 @@ def create_image(width, height, target=GL_RGBA):
     if target == GL_DEPTH_COMPONENT32:
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_MODE, GL_NONE)
 
-    glCopyTexImage2D(GL_TEXTURE_2D, 0, target, 0, 0, width, height, 0)
-
     glBindTexture(GL_TEXTURE_2D, 0)
 
     del null_buffer
@@ -141,7 +127,7 @@ def create_image(width, height, target=GL_RGBA):
 def delete_image(tex_id):
     """clear created image"""
     id_buf = Buffer(GL_INT, 1)
-    id_buf.to_list()[0] = tex_id
+    id_buf[0] = tex_id
 
     if glIsTexture(tex_id):
         glDeleteTextures(1, id_buf)
@@ -216,7 +202,7 @@ def create_framebuffer(width, height, target=GL_RGBA):
 def delete_framebuffer(fbo_id):
     """clear created framebuffer"""
     id_buf = Buffer(GL_INT, 1)
-    id_buf.to_list()[0] = fbo_id
+    id_buf[0] = fbo_id
 
     if glIsFramebuffer(fbo_id):
         glDeleteFramebuffers(1, id_buf)
@@ -241,24 +227,17 @@ def create_shader(source, program=None, type=GL_FRAGMENT_SHADER):
     glAttachShader(program, shader)
     glLinkProgram(program)
 
-    return program
-
+    # only flagged, the shader is freed together with the program
+    glDeleteShader(shader)
 
-def setup_uniforms(program, color_id, width, height, is_left):
-    """"""
-    uniform = glGetUniformLocation(program, "bgl_RenderedTexture")
-    glActiveTexture(GL_TEXTURE0)
-    glBindTexture(GL_TEXTURE_2D, color_id)
-    if uniform != -1: glUniform1i(uniform, 0)
+    return program
 
-    uniform = glGetUniformLocation(program, "bgl_RenderedTextureWidth")
-    if uniform != -1: glUniform1f(uniform, width)
 
-    uniform = glGetUniformLocation(program, "bgl_RenderedTextureHeight")
-    if uniform != -1: glUniform1f(uniform, height)
+def delete_shader(program):
+    """clear created program"""
+    if glIsProgram(program):
+        glDeleteProgram(program)
 
-    uniform = glGetUniformLocation(program, "bgl_RenderedStereoEye")
-    if uniform != -1: glUniform1i(uniform, 0 if is_left else 1)
 
 def bindcode(image):
     """load the image in the graphic card if necessary"""
@@ -267,111 +246,48 @@ def bindcode(image):
 
 
 # ##################
-# Drawing Routines
+# Vertex Batch
 # ##################
-def view_setup():
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-
-    glMatrixMode(GL_TEXTURE)
-    glPushMatrix()
-    glLoadIdentity()
-
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-
-    glOrtho(-1, 1, -1, 1, -20, 20)
-    gluLookAt(0.0, 0.0, 1.0, 0.0,0.0,0.0, 0.0,1.0,0.0)
-
-
-def view_reset():
-    # Get texture info
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-
-    glMatrixMode(GL_TEXTURE)
-    glPopMatrix()
+class QuadBatch:
+    """
+    four vertices (position and texture coordinate) drawn as a triangle fan
+    the arrays are kept between draws, only updated when the corners change
+    client-side vertex arrays and the GLSL 1.20 shaders need a compatibility profile
+    """
 
-    glMatrixMode(GL_MODELVIEW)
-    glPopMatrix()
+    def __init__(self, texco=((1.0, 1.0), (0.0, 1.0), (0.0, 0.0), (1.0, 0.0))):
+        self.positions = Buffer(GL_FLOAT, 8)
+        self.texco = Buffer(GL_FLOAT, 8, [c for co in texco for c in co])
+        self.corners = None
+        self.texco_corners = tuple(texco)
 
+    def update(self, corners, texco=None):
+        """set the four vertex positions (and texture coordinates), return False when they did not change"""
+        changed = False
 
-def draw_rectangle_rainbow(zed=0.0):
-    texco = [(1, 1), (0, 1), (0, 0), (1,0)]
-    verco = [(1.0, 1.0), (-1.0, 1.0), (-1.0, -1.0), ( 1.0, -1.0)]
-    colors = [(1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (1.0, 1.0, 0.0, 0.0)]
+        if corners != self.corners:
+            self.corners = corners
+            self.positions[:] = [c for co in corners for c in co]
+            changed = True
 
-    glPolygonMode(GL_FRONT_AND_BACK , GL_FILL)
+        if texco is not None and texco != self.texco_corners:
+            self.texco_corners = texco
+            self.texco[:] = [c for co in texco for c in co]
+            changed = True
 
-    glBegin(GL_QUADS)
-    for i in range(4):
-        color = colors[i]
-        glColor4f(color[0], color[1], color[2], color[3])
-        glTexCoord3f(texco[i][0], texco[i][1], zed)
-        glVertex2f(verco[i][0], verco[i][1])
-    glEnd()
+        return changed
 
+    def draw(self, position_location, texco_location):
+        glEnableVertexAttribArray(position_location)
+        glVertexAttribPointer(position_location, 2, GL_FLOAT, GL_FALSE, 0, self.positions)
 
-def draw_rectangle(zed=0.0):
-    texco = [(1, 1), (0, 1), (0, 0), (1,0)]
-    verco = [(1.0, 1.0), (-1.0, 1.0), (-1.0, -1.0), ( 1.0, -1.0)]
+        if texco_location != -1:
+            glEnableVertexAttribArray(texco_location)
+            glVertexAttribPointer(texco_location, 2, GL_FLOAT, GL_FALSE, 0, self.texco)
 
-    glPolygonMode(GL_FRONT_AND_BACK , GL_FILL)
-
-    glColor4f(1.0, 1.0, 1.0, 0.0)
-
-    glBegin(GL_QUADS)
-    for i in range(4):
-        glTexCoord3f(texco[i][0], texco[i][1], zed)
-        glVertex2f(verco[i][0], verco[i][1])
-    glEnd()
-
-
-def draw_callback_px(self, context):
-    """core function"""
-    if not self._enabled: return
-
-    is_left = self.is_stereo_left(context)
-
-    act_tex = Buffer(GL_INT, 1)
-    glGetIntegerv(GL_ACTIVE_TEXTURE, act_tex)
-
-    glGetIntegerv(GL_VIEWPORT, self.viewport)
-
-    # (1) dump buffer in texture
-    update_image(self.color_id, self.viewport, GL_RGBA, GL_TEXTURE0)
-
-    # (2) run screenshader
-    glEnable(GL_DEPTH_TEST)
-    glDepthFunc(GL_LESS)
-
-    pjm = Buffer(GL_FLOAT, 16)
-    mvm = Buffer(GL_FLOAT, 16)
-
-    cam_pos = context.scene.camera.location.copy()
-    glMatrixMode(GL_MODELVIEW)
-    glTranslatef(cam_pos[0], cam_pos[1], cam_pos[2])
-
-    glGetFloatv(GL_PROJECTION_MATRIX, pjm)
-    glGetFloatv(GL_MODELVIEW_MATRIX, mvm)
-
-    # set identity matrices
-    view_setup()
-
-    # update shader
-    glUseProgram(self.program_shader)
-    setup_uniforms(self.program_shader, self.color_id, self.width, self.height, is_left)
-    draw_rectangle()
-
-    # (3) restore opengl defaults
-    glUseProgram(0)
-    glActiveTexture(act_tex[0])
-    glBindTexture(GL_TEXTURE_2D, 0)
-    view_reset()
-    glViewport(self.viewport[0], self.viewport[1], self.viewport[2], self.viewport[3])
+        glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
 
+        glDisableVertexAttribArray(position_location)
 
-    glMatrixMode(GL_MODELVIEW)
-    glTranslatef(-cam_pos[0], -cam_pos[1], -cam_pos[2])
+        if texco_location != -1:
+            glDisableVertexAttribArray(texco_location)
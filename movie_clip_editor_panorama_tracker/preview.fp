@@ -1,5 +1,10 @@
 uniform mat4 transformation_matrix;
 uniform sampler2D color_buffer;
+uniform vec2 color_scale;
+uniform vec2 color_offset;
+uniform vec4 visible_texco;
+
+varying vec2 texco_var;
 
 #define PI  3.14159265
 
@@ -33,11 +38,22 @@ vec3 equirectangular2world(vec2 coords)
 
 void main()
 {
-    vec2 coords = gl_TexCoord[0].st;
+    vec2 coords = texco_var;
     vec3 source = equirectangular2world(coords);
     vec4 world = transformation_matrix * vec4(source.x, source.y, source.z, 1.0);
 
     vec2 uv = world2equirectangular(world.xyz);
+    uv = vec2(fract(uv.s), clamp(uv.t, 0.0, 1.0));
+
+    /* only the part of the clip on screen was copied, the rest is hatched */
+    if (any(lessThan(uv, visible_texco.xy)) || any(greaterThan(uv, visible_texco.zw))) {
+        float hatch = step(8.0, mod(gl_FragCoord.x + gl_FragCoord.y, 16.0));
+        gl_FragColor = vec4(vec3(0.15 + 0.1 * hatch), 1.0);
+        return;
+    }
+
+    /* the texture only holds the visible part of the clip, in its bottom left */
+    uv = uv * color_scale + color_offset;
 
     gl_FragColor.rgb = texture2D(color_buffer, uv).rgb;
     gl_FragColor.a = 1.0;
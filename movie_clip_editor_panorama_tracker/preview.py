@@ -23,26 +23,21 @@ import bpy
 from bpy.app.handlers import persistent
 
 from .opengl_helper import (
+        QuadBatch,
         calculate_image_size,
         create_image,
         create_shader,
         delete_image,
+        delete_shader,
         update_image,
-        view_reset,
-        view_setup,
         )
 
-from bgl import *
-
-from mathutils import (
-        Matrix,
-        )
+from . import preview_cpu
+from . import profiling
 
-from math import (
-        radians,
-        )
+from bgl import *
 
-TODO = False
+import time
 
 
 # ###############################
@@ -60,13 +55,87 @@ def show_preview_update(settings, context):
         panorama_reset(pg)
 
 
+def preview_backend_update(settings, context):
+    movieclip = context.edit_movieclip
+    pg = bpy.panorama_globals
+
+    if settings.show_preview:
+        panorama_reset(pg)
+        panorama_setup(pg, movieclip)
+
+
 # ###############################
 # Utils
 # ###############################
 
-def resize(panorama_globals, movieclip, viewport):
-    """we can run every frame or only when width/height change"""
-    pg = bpy.panorama_globals
+# the reprojection runs at 1/scale of the clip editor resolution
+PREVIEW_QUALITY_SCALES = {
+        'FULL': 1,
+        'HALF': 2,
+        'QUARTER': 4,
+        }
+
+# interactive quality, used during playback and for a moment after every change
+INTERACTIVE_SCALE = 4
+INTERACTIVE_IDLE = 0.25
+
+
+def get_preview_scale(pr, settings, screen, signature):
+    """return the resolution divider of the preview and whether it has to be refined later"""
+    quality = settings.preview_quality
+
+    if quality != 'INTERACTIVE':
+        return PREVIEW_QUALITY_SCALES[quality], False
+
+    now = time.time()
+    if signature != pr.interactive_signature:
+        pr.interactive_signature = signature
+        pr.interactive_time = now
+
+    if screen.is_animation_playing:
+        return INTERACTIVE_SCALE, False
+
+    if now - pr.interactive_time < INTERACTIVE_IDLE:
+        return INTERACTIVE_SCALE, True
+
+    return 1, False
+
+
+# clip editor display options that change what is drawn under the preview
+OVERLAY_PROPERTIES = (
+        'mode', 'view', 'path_length',
+        'show_marker_pattern', 'show_marker_search', 'show_disabled', 'show_track_path',
+        'show_names', 'show_tiny_markers', 'show_bundles', 'show_grid', 'show_stable',
+        'show_gpencil', 'show_filters', 'show_mask_overlay', 'show_metadata',
+        'show_red_channel', 'show_green_channel', 'show_blue_channel',
+        'use_mute_footage', 'use_grayscale_preview',
+        )
+
+
+def get_overlay_signature(space, movieclip):
+    """
+    what the clip editor draws under the preview besides the clip, from cheap scalars:
+    display options, active track, and the version bumped when the clip, masks or grease pencil change
+    """
+    tracking = movieclip.tracking.objects[movieclip.tracking.active_object_index]
+    active = tracking.tracks.active
+
+    return (tuple(getattr(space, name) for name in OVERLAY_PROPERTIES if hasattr(space, name)),
+            movieclip.filepath,
+            active.name if active else None,
+            bpy.panorama_globals.data_version)
+
+
+# datablocks whose changes are drawn in the clip editor (tracking, masks, annotations)
+OVERLAY_DATA = ('movieclips', 'masks', 'grease_pencil')
+
+
+def resize(preview_region, viewport):
+    """
+    we can run every frame, the texture is only created when width/height change
+    viewport : the visible part of the clip
+    """
+    pr = preview_region
 
     width = viewport[2]
     height = viewport[3]
@@ -74,42 +143,111 @@ def resize(panorama_globals, movieclip, viewport):
     # power of two dimensions
     buffer_width, buffer_height = calculate_image_size(width, height)
 
-    if (buffer_width == pg.buffer_width) and \
-       (buffer_height == pg.buffer_height):
+    if (buffer_width == pr.buffer_width) and \
+       (buffer_height == pr.buffer_height):
         return
 
-    # remove old textures
-    panorama_reset(pg)
-    pg.is_enabled = True
+    pr.free()
 
-    pg.buffer_width = width
-    pg.buffer_height = height
+    pr.buffer_width = buffer_width
+    pr.buffer_height = buffer_height
 
     # image to dump screen buffer
-    pg.color_texture = create_image(pg.buffer_width, pg.buffer_height, GL_RGBA)
+    pr.color_texture = create_image(pr.buffer_width, pr.buffer_height, GL_RGBA)
+
+    # image to keep the reprojected result
+    pr.result_texture = create_image(pr.buffer_width, pr.buffer_height, GL_RGBA)
 
 
 def get_glsl_shader(shader_file):
+    """return the shader source, only read again when the file changes"""
     import os
     folderpath = os.path.dirname(os.path.abspath(__file__))
     filepath = os.path.join(folderpath, shader_file)
+
+    mtime = os.path.getmtime(filepath)
+    cached = _shader_sources.get(filepath)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
     f = open(filepath, 'r')
     data = f.read()
     f.close()
+
+    _shader_sources[filepath] = (mtime, data)
     return data
 
 
-def view_setup():
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
+class PreviewProgram:
+    """linked program and the locations of its uniforms and attributes"""
+
+    def __init__(self, vertex_source, fragment_source, uniforms, attributes):
+        self.program = create_shader(vertex_source, type=GL_VERTEX_SHADER)
+        create_shader(fragment_source, self.program, type=GL_FRAGMENT_SHADER)
+
+        self.uniforms = {}
+        for name in uniforms:
+            self.uniforms[name] = glGetUniformLocation(self.program, name)
 
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
+        self.attributes = {}
+        for name in attributes:
+            self.attributes[name] = glGetAttribLocation(self.program, name)
+
+        success = Buffer(GL_INT, 1)
+        glGetProgramiv(self.program, GL_LINK_STATUS, success)
+        self.is_linked = bool(success[0])
+
+
+PREVIEW_UNIFORMS = (
+        "color_buffer",
+        "transformation_matrix",
+        "color_scale",
+        "color_offset",
+        "visible_texco",
+        )
+
+PREVIEW_ATTRIBUTES = (
+        "position",
+        "texco",
+        )
+
+BLIT_UNIFORMS = (
+        "color_buffer",
+        "color_scale",
+        "color_offset",
+        )
+
+_shader_sources = {}
+_programs = {}
+
+
+def get_program(vertex_file, fragment_file, uniforms, attributes):
+    """return the PreviewProgram of the shaders, built only when their source changes"""
+    import hashlib
+
+    vertex_source = get_glsl_shader(vertex_file)
+    fragment_source = get_glsl_shader(fragment_file)
+    key = hashlib.sha1((vertex_source + fragment_source).encode('utf-8')).hexdigest()
+
+    cached = _programs.get(fragment_file)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    if cached:
+        delete_shader(cached[1].program)
+
+    program = PreviewProgram(vertex_source, fragment_source, uniforms, attributes)
+    _programs[fragment_file] = (key, program)
+    return program
+
+
+def clear_programs():
+    """delete all the cached programs"""
+    for key, program in _programs.values():
+        delete_shader(program.program)
+
+    _programs.clear()
 
-    glOrtho(0, 1, 0, 1, -15, 15)
-    gluLookAt(0.0, 0.0, 1.0, 0.0,0.0,0.0, 0.0,1.0,0.0)
 
 def get_markers_coordinates(tracking, settings, frame=1):
     coordinates =[]
@@ -129,51 +267,174 @@ def get_markers_coordinates(tracking, settings, frame=1):
     return coordinates
 
 
-def draw_rectangle(region, width, height):
-    coordinates=((1,1),(0,1),(0,0),(1,0))
-    texco = [(1, 1), (0, 1), (0, 0), (1,0)]
+def update_rectangle(quad, viewport, width, height, texco=(0.0, 0.0, 1.0, 1.0)):
+    """the rectangle corners projected in the region, only changes with the view"""
+    x0 = viewport[0] / float(width)
+    y0 = viewport[1] / float(height)
+    x1 = (viewport[0] + viewport[2]) / float(width)
+    y1 = (viewport[1] + viewport[3]) / float(height)
 
-    verco = []
-    for x,y in coordinates:
-        co = list(region.view2d.view_to_region(x,y, False))
-        co[0] /= float(width)
-        co[1] /= float(height)
-        verco.append(co)
+    s0, t0, s1, t1 = texco
 
-    glPolygonMode(GL_FRONT_AND_BACK , GL_FILL)
-    glBegin(GL_QUADS)
+    quad.update(((x1, y1), (x0, y1), (x0, y0), (x1, y0)),
+                ((s1, t1), (s0, t1), (s0, t0), (s1, t0)))
 
-    for i in range(4):
-        glColor4f(1.0, 1.0, 1.0, 0.0)
-        glTexCoord3f(texco[i][0], texco[i][1], 0.0)
-        glVertex2f(verco[i][0], verco[i][1])
-    glEnd()
 
+def get_visible_viewport(viewport, width, height):
+    """the part of the clip viewport inside the region, None when the clip is not visible"""
+    x0 = max(viewport[0], 0)
+    y0 = max(viewport[1], 0)
+    x1 = min(viewport[0] + viewport[2], width)
+    y1 = min(viewport[1] + viewport[3], height)
+
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    return [x0, y0, x1 - x0, y1 - y0]
+
+
+def get_visible_texco(visible, viewport):
+    """the clip coordinates (0,0 to 1,1) of the visible part"""
+    s0 = (visible[0] - viewport[0]) / float(viewport[2])
+    t0 = (visible[1] - viewport[1]) / float(viewport[3])
+    s1 = (visible[0] + visible[2] - viewport[0]) / float(viewport[2])
+    t1 = (visible[1] + visible[3] - viewport[1]) / float(viewport[3])
+
+    return s0, t0, s1, t1
+
+
+# ###############################
+# Region Registry
+# ###############################
+
+class PreviewRegion:
+    """
+    preview state of a clip editor region: its textures, the last
+    reprojected result and the view2d mapping of the clip
+    """
+
+    def __init__(self):
+        self.buffer_width = -1
+        self.buffer_height = -1
+        self.color_texture = -1
+        self.result_texture = -1
+        self.signature = None
+        self.result_scale = (1.0, 1.0)
+        self.result_offset = (0.0, 0.0)
+        self.interactive_signature = None
+        self.interactive_time = 0.0
+
+        # view2d mapping, see get_viewport
+        self.origin = None
+        self.size = None
+        self.viewport = None
+
+        self.quad = QuadBatch()
+        self.proxy_quad = QuadBatch()
+
+    def free(self):
+        if self.color_texture != -1:
+            delete_image(self.color_texture)
+
+        if self.result_texture != -1:
+            delete_image(self.result_texture)
+
+        self.color_texture = -1
+        self.result_texture = -1
+        self.buffer_width = -1
+        self.buffer_height = -1
+        self.signature = None
+
+    def get_viewport(self, region):
+        """
+        return the clip rectangle in region coordinates, [x, y, width, height]
+
+        the clip corner is projected every draw, the opposite corner only
+        when the corner or the region size moved (pan, zoom or resize)
+        """
+        view2d = region.view2d
+        origin = tuple(view2d.view_to_region(0.0, 0.0, clip=False))
+        size = (region.width, region.height)
+
+        if origin != self.origin or size != self.size:
+            top = view2d.view_to_region(1.0, 1.0, clip=False)
+
+            self.origin = origin
+            self.size = size
+            self.viewport = [origin[0], origin[1], top[0] - origin[0], top[1] - origin[1]]
+
+        return self.viewport[:]
+
+
+class RegionRegistry:
+    """
+    the PreviewRegion of every clip editor region the preview is drawn in
+    everything is dropped when the screen or its layout change
+    """
+
+    def __init__(self):
+        self.regions = {}
+        self.layout = None
 
-def get_clipeditor_region():
-    for area in bpy.context.screen.areas:
-        if area.type == 'CLIP_EDITOR':
-            for region in area.regions:
-                if region.type == 'WINDOW':
+    def get(self, context):
+        """return the PreviewRegion of the region being drawn"""
+        screen = context.screen
+        layout = (screen.as_pointer(), len(screen.areas))
 
-                    bot = region.view2d.view_to_region(0.0, 0.0)
-                    top = region.view2d.view_to_region(1.0, 1.0)
+        if layout != self.layout:
+            self.clear()
+            self.layout = layout
 
-                    if bot[0] == 12000 or top[0] == 12000:
-                        return None, [0,0,0,0]
+        key = context.region.as_pointer()
+        pr = self.regions.get(key)
 
-                    width = top[0] - bot[0]
-                    height = top[1] - bot[1]
+        if pr is None:
+            pr = PreviewRegion()
+            self.regions[key] = pr
 
-                    return region, [bot[0], bot[1], width, height]
+        return pr
 
-    return None, [0,0,0,0]
+    def clear(self):
+        """free the textures of all the regions"""
+        for pr in self.regions.values():
+            pr.free()
+
+        self.regions.clear()
+        self.layout = None
 
 
 # ###############################
 # Setup and Reset
 # ###############################
 
+def setup_programs(pg):
+    """get the glsl programs, return False when OpenGL can not run them"""
+    if bpy.app.background:
+        return False
+
+    try:
+        # glsl shaders, compiled once per session
+        program = get_program('preview.vp', 'preview.fp', PREVIEW_UNIFORMS, PREVIEW_ATTRIBUTES)
+        blit_program = get_program('preview.vp', 'preview_blit.fp', BLIT_UNIFORMS, PREVIEW_ATTRIBUTES)
+    except Exception as E:
+        print("Panorama Tracker: OpenGL preview unavailable ({0})".format(E))
+        return False
+
+    if not (program.is_linked and blit_program.is_linked):
+        print("Panorama Tracker: OpenGL preview unavailable, using the CPU preview")
+        return False
+
+    pg.program = program.program
+    pg.uniforms = program.uniforms
+    pg.attributes = program.attributes
+
+    pg.blit_program = blit_program.program
+    pg.blit_uniforms = blit_program.uniforms
+    pg.blit_attributes = blit_program.attributes
+
+    return True
+
+
 def panorama_setup(panorama_globals, movieclip):
     pg = panorama_globals
 
@@ -182,14 +443,13 @@ def panorama_setup(panorama_globals, movieclip):
 
     pg.is_enabled = True
 
-    region, viewport = get_clipeditor_region()
-
-    # create initial image
-    resize(pg, movieclip, viewport)
+    backend = movieclip.panorama_settings.preview_backend if movieclip else 'AUTO'
 
-    # glsl shaders
-    fragment_shader = get_glsl_shader('preview.fp')
-    pg.program = create_shader(fragment_shader, type=GL_FRAGMENT_SHADER)
+    if backend == 'CPU' or not setup_programs(pg):
+        pg.backend = 'CPU'
+        preview_cpu.stats.reset()
+    else:
+        pg.backend = 'GPU'
 
     from . import core
     core.update_panorama_orientation(bpy.context.scene)
@@ -203,88 +463,201 @@ def panorama_reset(panorama_globals):
 
     pg.is_enabled = False
 
-    if pg.color_texture:
-        delete_image(pg.color_texture)
+    # textures are created again on the next draw
+    pg.registry.clear()
+    preview_cpu.clear()
 
-    TODO # delete shader
+    # the programs themselves stay in the cache
+    pg.program = -1
+    pg.blit_program = -1
 
 
 # ###############################
 # Main Drawing Routine
 # ###############################
 
-def setup_uniforms(program, color_texture, transformation_matrix):
-    uniform = glGetUniformLocation(program, "color_buffer")
+def setup_uniforms(uniforms, color_texture, transformation_matrix, color_scale, color_offset, texco):
+    uniform = uniforms["color_buffer"]
     glActiveTexture(GL_TEXTURE0)
     glBindTexture(GL_TEXTURE_2D, color_texture)
     if uniform != -1: glUniform1i(uniform, 0)
 
-    uniform = glGetUniformLocation(program, "transformation_matrix")
+    uniform = uniforms["transformation_matrix"]
     if uniform != -1: glUniformMatrix4fv(uniform, 1, 0, transformation_matrix)
 
+    uniform = uniforms["color_scale"]
+    if uniform != -1: glUniform2f(uniform, color_scale[0], color_scale[1])
+
+    uniform = uniforms["color_offset"]
+    if uniform != -1: glUniform2f(uniform, color_offset[0], color_offset[1])
+
+    uniform = uniforms["visible_texco"]
+    if uniform != -1: glUniform4f(uniform, texco[0], texco[1], texco[2], texco[3])
+
+
+def draw_reprojection(pg, pr, viewport, texco, color_scale, color_offset):
+    """run the panorama shader over the visible part of the clip and keep the result"""
+
+    # dump buffer in texture
+    update_image(pr.color_texture, viewport, GL_RGBA, GL_TEXTURE0)
+
+    # run screenshader
+    glUseProgram(pg.program)
+
+    # update uniforms
+
+    # calculate matrixes
+    matrix = pg.orientation
+
+    # applied the  calibration matrix
+    transformation_matrix = pg.matrix_buffer
+    for i in range(4):
+        transformation_matrix[i] = matrix[i]
+
+    setup_uniforms(pg.uniforms, pr.color_texture, transformation_matrix, color_scale, color_offset, texco)
+
+    pr.quad.draw(pg.attributes["position"], pg.attributes["texco"])
+
+    # keep the result for the next redraws
+    update_image(pr.result_texture, viewport, GL_RGBA, GL_TEXTURE0)
+    pr.result_scale = color_scale
+    pr.result_offset = color_offset
+
+
+def draw_reprojection_proxy(pg, pr, viewport, visible, region, texco, color_scale, color_offset, scale):
+    """run the panorama shader at a reduced resolution and draw it scaled up"""
+
+    # the source is copied at full resolution, only the shading is reduced
+    update_image(pr.color_texture, viewport, GL_RGBA, GL_TEXTURE0)
+
+    width = max(1, visible[2] // scale)
+    height = max(1, visible[3] // scale)
+
+    # the reduced result is drawn in the corner of the visible part, the final draw covers it
+    proxy_viewport = [visible[0], visible[1], width, height]
+    update_rectangle(pr.proxy_quad, proxy_viewport, region.width, region.height, texco)
+
+    glUseProgram(pg.program)
+
+    transformation_matrix = pg.matrix_buffer
+    for i in range(4):
+        transformation_matrix[i] = pg.orientation[i]
+
+    setup_uniforms(pg.uniforms, pr.color_texture, transformation_matrix, color_scale, color_offset, texco)
+
+    pr.proxy_quad.draw(pg.attributes["position"], pg.attributes["texco"])
+
+    update_image(pr.result_texture, [viewport[0], viewport[1], width, height], GL_RGBA, GL_TEXTURE0)
+
+    ratio_x = width / float(visible[2])
+    ratio_y = height / float(visible[3])
+    pr.result_scale = (color_scale[0] * ratio_x, color_scale[1] * ratio_y)
+    pr.result_offset = (color_offset[0] * ratio_x, color_offset[1] * ratio_y)
+
+    draw_cached(pg, pr)
+
+
+def draw_cached(pg, pr):
+    """draw the last reprojected result again"""
+    glUseProgram(pg.blit_program)
+
+    uniform = pg.blit_uniforms["color_buffer"]
+    glActiveTexture(GL_TEXTURE0)
+    glBindTexture(GL_TEXTURE_2D, pr.result_texture)
+    if uniform != -1: glUniform1i(uniform, 0)
+
+    uniform = pg.blit_uniforms["color_scale"]
+    if uniform != -1: glUniform2f(uniform, pr.result_scale[0], pr.result_scale[1])
+
+    uniform = pg.blit_uniforms["color_offset"]
+    if uniform != -1: glUniform2f(uniform, pr.result_offset[0], pr.result_offset[1])
+
+    pr.quad.draw(pg.blit_attributes["position"], pg.blit_attributes["texco"])
+
 
 @persistent
+@profiling.timed("draw_panorama_callback_px")
 def draw_panorama_callback_px(not_used):
     """"""
     pg = bpy.panorama_globals
 
-    if not pg.is_enabled: return
+    if not pg.is_enabled or pg.backend != 'GPU': return
 
-    movieclip = bpy.context.edit_movieclip
-    scene = bpy.context.scene
+    context = bpy.context
+    movieclip = context.edit_movieclip
+    scene = context.scene
 
     if not movieclip: return
 
     settings = movieclip.panorama_settings
     if not settings.show_preview: return
 
-    tracking = movieclip.tracking.objects[movieclip.tracking.active_object_index]
+    # the handler runs for the region being drawn, every clip editor has its own state
+    region = context.region
+    pr = pg.registry.get(context)
+    viewport = pr.get_viewport(region)
+
+    # when zoomed in only the part of the clip inside the region is copied and shaded,
+    # the clip is only on screen there, lookups outside of it are masked by the shader
+    visible = get_visible_viewport(viewport, region.width, region.height)
+    if not visible: return
 
-    region, viewport = get_clipeditor_region()
-    if not region: return
+    texco = get_visible_texco(visible, viewport)
 
-    resize(pg, movieclip, viewport)
+    resize(pr, visible)
+    update_rectangle(pr.quad, visible, region.width, region.height, texco)
 
     # opengl part
 
-    act_tex = Buffer(GL_INT, 1)
+    act_tex = pg.act_tex_buffer
     glGetIntegerv(GL_TEXTURE_BINDING_2D, act_tex)
 
     # add window viewport
 
-    winviewport = Buffer(GL_INT, 4)
+    winviewport = pg.viewport_buffer
     glGetIntegerv(GL_VIEWPORT, winviewport)
 
-    viewport[0] += winviewport[0]
-    viewport[1] += winviewport[1]
+    window_visible = [visible[0] + winviewport[0], visible[1] + winviewport[1], visible[2], visible[3]]
 
-    # dump buffer in texture
-    update_image(pg.color_texture, viewport, GL_RGBA, GL_TEXTURE0)
+    # the clip editor draws the clip again, but the reprojection only
+    # has to run again when what it depends on changed
+    signature = (
+            movieclip.name,
+            scene.frame_current,
+            tuple(tuple(row) for row in pg.orientation),
+            tuple(viewport),
+            region.width,
+            region.height,
+            get_overlay_signature(context.space_data, movieclip),
+            )
 
-    # run screenshader
-    glEnable(GL_DEPTH_TEST)
-    glDepthFunc(GL_LESS)
+    scale, refine = get_preview_scale(pr, settings, context.screen, signature)
+    signature += (scale,)
 
-    # set identity matrices
-    view_setup()
+    # from clip coordinates to the pow2 textures, which only hold the visible part
+    color_scale = (viewport[2] / pr.buffer_width, viewport[3] / pr.buffer_height)
+    color_offset = ((viewport[0] - visible[0]) / pr.buffer_width, (viewport[1] - visible[1]) / pr.buffer_height)
 
-    glUseProgram(pg.program)
-
-    # update uniforms
-
-    # calculate matrixes
-    matrix = pg.orientation
-
-    # applied the  calibration matrix
-    transformation_matrix = Buffer(GL_FLOAT, (4,4), matrix)
-
-    setup_uniforms(pg.program, pg.color_texture, transformation_matrix)
+    glEnable(GL_DEPTH_TEST)
+    glDepthFunc(GL_LEQUAL)
+
+    if signature == pr.signature:
+        pg.stats.skipped += 1
+        draw_cached(pg, pr)
+    elif scale > 1:
+        pg.stats.executed += 1
+        draw_reprojection_proxy(pg, pr, window_visible, visible, region, texco, color_scale, color_offset, scale)
+        pr.signature = signature
+    else:
+        pg.stats.executed += 1
+        draw_reprojection(pg, pr, window_visible, texco, color_scale, color_offset)
+        pr.signature = signature
 
-    draw_rectangle(region, region.width, region.height)
+    # redraw until the interactive preview is idle long enough to be refined
+    if refine:
+        context.area.tag_redraw()
 
     # restore opengl defaults
-    view_reset()
-
     glUseProgram(0)
     glActiveTexture(act_tex[0])
     glBindTexture(GL_TEXTURE_2D, 0)
@@ -305,15 +678,43 @@ def draw_panorama_callback_px(not_used):
 # Globals
 # ############################################################
 
+class PreviewStats:
+    """how many redraws had to run the reprojection"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.executed = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return "{0} reprojected, {1} reused".format(self.executed, self.skipped)
+
+
 class PanoramaGlobals:
     is_enabled = False
     handle = None
-    buffer_width = -1
-    buffer_height = -1
-    color_texture = -1
+    backend = 'GPU'
     program = -1
+    uniforms = {}
+    attributes = {}
+    blit_program = -1
+    blit_uniforms = {}
+    blit_attributes = {}
     orientation = [[i for i in range(4)] for j in range(4)]
 
+    # bumped by panorama_tracker_scene_update, invalidates the cached previews
+    data_version = 0
+
+    def __init__(self):
+        # reused by every draw
+        self.act_tex_buffer = Buffer(GL_INT, 1)
+        self.viewport_buffer = Buffer(GL_INT, 4)
+        self.matrix_buffer = Buffer(GL_FLOAT, (4,4))
+        self.registry = RegionRegistry()
+        self.stats = PreviewStats()
+
 
 # ############################################################
 # Callbacks
@@ -329,12 +730,27 @@ def panorama_tracker_load_post(dummy):
     panorama_reset(bpy.panorama_globals)
 
 
+@persistent
+def panorama_tracker_scene_update(scene):
+    """tracking edits (marker drags, selection, reloads), masks and grease pencil changes are redrawn"""
+    pg = bpy.panorama_globals
+    if not pg.is_enabled: return
+
+    data = bpy.data
+    for name in OVERLAY_DATA:
+        collection = getattr(data, name, None)
+        if collection is not None and collection.is_updated:
+            pg.data_version += 1
+            return
+
+
 # ###############################
 #  Register / Unregister
 # ###############################
 def register():
     bpy.app.handlers.load_pre.append(panorama_tracker_load_pre)
     bpy.app.handlers.load_pre.append(panorama_tracker_load_post)
+    bpy.app.handlers.scene_update_post.append(panorama_tracker_scene_update)
 
     bpy.panorama_globals = PanoramaGlobals()
     bpy.panorama_globals.handler = bpy.types.SpaceClipEditor.draw_handler_add(draw_panorama_callback_px, (None,), 'WINDOW', 'POST_PIXEL')
@@ -343,5 +759,9 @@ def register():
 def unregister():
     bpy.app.handlers.load_pre.remove(panorama_tracker_load_pre)
     bpy.app.handlers.load_pre.remove(panorama_tracker_load_post)
+    bpy.app.handlers.scene_update_post.remove(panorama_tracker_scene_update)
 
     bpy.types.SpaceClipEditor.draw_handler_remove(bpy.panorama_globals.handler, 'WINDOW')
+
+    panorama_reset(bpy.panorama_globals)
+    clear_programs()
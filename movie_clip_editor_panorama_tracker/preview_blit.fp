@@ -0,0 +1,11 @@
+uniform sampler2D color_buffer;
+uniform vec2 color_scale;
+uniform vec2 color_offset;
+
+varying vec2 texco_var;
+
+void main()
+{
+    gl_FragColor.rgb = texture2D(color_buffer, texco_var * color_scale + color_offset).rgb;
+    gl_FragColor.a = 1.0;
+}
@@ -0,0 +1,163 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Software fallback of the stabilization preview
+
+Used when OpenGL is not available (background, remote desktop, software
+GL). The current frame is downscaled, reprojected with the same math as
+preview.fp (see reproject.py) and written into the "Panorama Preview"
+image, which can be shown in an image editor.
+"""
+
+import time
+
+import numpy as np
+
+import bpy
+
+from . import frames
+from .reproject import reproject
+from .render import clip_sequence
+
+
+# width the source frames are downscaled to
+PREVIEW_WIDTH = 1024
+
+# the downscaled frames are small, a few hundred of them fit in the budget
+FRAME_CACHE_BUDGET = 128 * 1024 * 1024
+FRAME_CACHE_PREFETCH = 4
+
+PREVIEW_IMAGE = "Panorama Preview"
+
+
+class CPUPreviewStats:
+    """time taken by the last update of the preview image"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.seconds = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.seconds += seconds
+        self.last = seconds
+
+    def __str__(self):
+        mean = self.seconds / self.frames if self.frames else 0.0
+        return "CPU preview {0:.1f} ms (mean {1:.1f} ms)".format(self.last * 1000.0, mean * 1000.0)
+
+
+stats = CPUPreviewStats()
+
+_cache = None
+
+
+def downscale(pixels, width=PREVIEW_WIDTH):
+    """return the pixels reduced by an integer step to about width columns"""
+    step = max(1, pixels.shape[1] // width)
+    if step == 1:
+        return pixels
+
+    return np.ascontiguousarray(pixels[::step, ::step])
+
+
+def load_preview_frame(filepath):
+    return downscale(frames.load_frame(filepath))
+
+
+def get_frame_cache(movieclip):
+    """return the cache of downscaled frames of the clip"""
+    global _cache
+
+    filepath, offset = clip_sequence(movieclip)
+    key = (filepath, offset)
+
+    if _cache is None or _cache[0] != key:
+        clear()
+
+        def frame_filepath(frame):
+            return frames.sequence_filepath(filepath, frame + offset)
+
+        _cache = (key, frames.FrameCache(frame_filepath, FRAME_CACHE_BUDGET, FRAME_CACHE_PREFETCH, load_preview_frame))
+
+    return _cache[1]
+
+
+def get_cache_stats():
+    """return the FrameCacheStats of the frames decoded while scrubbing, or None"""
+    return _cache[1].stats if _cache else None
+
+
+def get_preview_image(width, height):
+    """return the preview image, created or resized if needed"""
+    image = bpy.data.images.get(PREVIEW_IMAGE)
+
+    if image and tuple(image.size) != (width, height):
+        bpy.data.images.remove(image)
+        image = None
+
+    if not image:
+        image = bpy.data.images.new(PREVIEW_IMAGE, width, height)
+
+    return image
+
+
+def update_preview(scene, orientation):
+    """
+    reproject the current frame of the scene panorama clip into the preview image
+    orientation : 4x4 preview matrix, as PanoramaGlobals.orientation
+    """
+    movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+    if not movieclip or movieclip.source != 'SEQUENCE':
+        return
+
+    start = time.time()
+
+    try:
+        pixels = get_frame_cache(movieclip).get(scene.frame_current)
+    except (IOError, OSError, RuntimeError):
+        return
+
+    matrix = np.array([row[:3] for row in orientation[:3]], dtype=np.float32)
+    result = reproject(pixels, matrix, yaw_tolerance=movieclip.panorama_settings.yaw_tolerance)
+
+    height, width = result.shape[:2]
+    rgba = np.ones((height, width, 4), dtype=np.float32)
+    rgba[..., :3] = result[..., :3] * np.float32(1.0 / 255.0)
+
+    # a single bulk copy into the image
+    image = get_preview_image(width, height)
+    image.pixels.foreach_set(rgba.ravel())
+
+    stats.add(time.time() - start)
+
+
+def clear():
+    """free the cached frames"""
+    global _cache
+
+    if _cache:
+        _cache[1].close()
+        _cache = None
@@ -0,0 +1,198 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Timing of the addon entry points (handlers, draw callback, operators)
+
+Disabled by default, a timed function then only costs a flag test.
+PANORAMA_TRACKER_PROFILE=1 enables the timers from startup, and
+PANORAMA_TRACKER_CPROFILE=file.prof runs the whole session in cProfile.
+"""
+
+import functools
+import json
+import os
+import time
+
+from collections import deque
+
+# durations kept per entry point for the percentiles
+WINDOW = 1000
+
+_enabled = bool(os.environ.get("PANORAMA_TRACKER_PROFILE"))
+_timers = {}
+_profile = None
+
+
+class Timer:
+    """call count, total time and the most recent durations of an entry point"""
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.durations = deque(maxlen=WINDOW)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.durations.append(seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """percentile of the recent durations, in seconds"""
+        if not self.durations:
+            return 0.0
+
+        durations = sorted(self.durations)
+        index = int(round((len(durations) - 1) * percent / 100.0))
+        return durations[index]
+
+    def to_dict(self):
+        return {
+                "count": self.count,
+                "total_ms": self.total * 1000.0,
+                "mean_ms": self.mean * 1000.0,
+                "p50_ms": self.percentile(50) * 1000.0,
+                "p95_ms": self.percentile(95) * 1000.0,
+                "p99_ms": self.percentile(99) * 1000.0,
+                "max_ms": max(self.durations) * 1000.0 if self.durations else 0.0,
+                }
+
+    def __str__(self):
+        return "{0}: {1} calls, {2:.2f} ms mean, {3:.2f} ms p95".format(
+                self.name, self.count, self.mean * 1000.0, self.percentile(95) * 1000.0)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(state=True):
+    global _enabled
+    _enabled = state
+
+
+def get_timer(name):
+    timer = _timers.get(name)
+
+    if timer is None:
+        timer = Timer(name)
+        _timers[name] = timer
+
+    return timer
+
+
+def timers():
+    """the timers that were called, sorted by name"""
+    return [_timers[name] for name in sorted(_timers)]
+
+
+def reset():
+    for timer in _timers.values():
+        timer.reset()
+
+
+def timed(name):
+    """decorator, record the wall time of every call when profiling is enabled"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                get_timer(name).add(time.perf_counter() - start)
+
+        return wrapper
+    return decorator
+
+
+def timed_method(name):
+    """
+    timed for (self, context) methods, bpy checks the number of
+    arguments of the operator methods
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, context):
+            if not _enabled:
+                return function(self, context)
+
+            start = time.perf_counter()
+            try:
+                return function(self, context)
+            finally:
+                get_timer(name).add(time.perf_counter() - start)
+
+        return wrapper
+    return decorator
+
+
+def to_dict():
+    return dict((timer.name, timer.to_dict()) for timer in timers())
+
+
+def dump(filepath):
+    """write the statistics of all the timers to a json file"""
+    with open(filepath, 'w') as f:
+        json.dump(to_dict(), f, indent=2, sort_keys=True)
+
+
+# ###############################
+# cProfile
+# ###############################
+
+def start_cprofile():
+    """run cProfile until stop_cprofile if PANORAMA_TRACKER_CPROFILE is set"""
+    global _profile
+
+    if _profile or not os.environ.get("PANORAMA_TRACKER_CPROFILE"):
+        return
+
+    import atexit
+    import cProfile
+
+    _profile = cProfile.Profile()
+    _profile.enable()
+
+    # Blender may quit without unregistering the addon
+    atexit.register(stop_cprofile)
+
+
+def stop_cprofile():
+    """stop cProfile and write its statistics to PANORAMA_TRACKER_CPROFILE"""
+    global _profile
+
+    if not _profile:
+        return
+
+    _profile.disable()
+    _profile.dump_stats(os.environ["PANORAMA_TRACKER_CPROFILE"])
+    _profile = None
@@ -0,0 +1,234 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Stabilized frames rendered on the CPU, without going through Cycles
+
+render_frames only needs numpy (and Pillow outside of Blender), the
+operator gathers the source files and orientations from the scene.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from . import frames
+from . import profiling
+from . import reproject as _reproject
+from .reproject import reproject
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+# ###############################
+# Global Functions
+# ###############################
+
+class FrameJob:
+    """a single frame to stabilize"""
+
+    def __init__(self, frame, source, output, matrix):
+        self.frame = frame
+        self.source = source
+        self.output = output
+        self.matrix = matrix
+
+
+# decoded frames kept while rendering, the next frames are decoded meanwhile
+FRAME_CACHE_BUDGET = 256 * 1024 * 1024
+FRAME_CACHE_PREFETCH = 4
+
+# FrameCacheStats of the last CPU render, shown in the panel
+last_cache_stats = None
+
+
+def render_frame(job, width=None, height=None, scene=None, yaw_tolerance=_reproject.YAW_TOLERANCE,
+                 threads=1, image=None):
+    """read, reproject and write a single frame"""
+    if image is None:
+        image = frames.load_frame(job.source)
+
+    result = reproject(image, job.matrix, width, height, yaw_tolerance, threads)
+    frames.save_frame(job.output, result, scene)
+
+
+def render_frames(jobs, width=None, height=None, scene=None, report=None,
+                  yaw_tolerance=_reproject.YAW_TOLERANCE, threads=None,
+                  cache_budget=FRAME_CACHE_BUDGET, raw_store=None):
+    """
+    stabilize all the jobs in order, return the statistics of the frame cache
+    report : optional function(job, seconds) called after every frame, the
+             time is also kept in the "render_frame" profiling timer
+    threads : threads used for each frame, defaults to one per cpu
+    raw_store : optional framestore.RawFrameStore the frames are read through
+    """
+    if threads is None:
+        threads = multiprocessing.cpu_count()
+
+    loader = raw_store.load if raw_store else frames.load_frame
+
+    sources = dict((job.frame, job.source) for job in jobs)
+    cache = frames.FrameCache(sources.get, cache_budget, FRAME_CACHE_PREFETCH, loader)
+
+    try:
+        for job in jobs:
+            start = time.time()
+            render_frame(job, width, height, scene, yaw_tolerance, threads, cache.get(job.frame))
+            seconds = time.time() - start
+
+            if profiling.is_enabled():
+                profiling.get_timer("render_frame").add(seconds)
+
+            if report:
+                report(job, seconds)
+    finally:
+        cache.close()
+
+    return cache.stats
+
+
+def data_frame_jobs(data, frame_start, frame_end, output, source=None):
+    """
+    return the FrameJob of the frames of a stabilization.StabilizationData, only their records are read
+    output : output path, see frames.frame_output_path
+    source : path of the image sequence, replaces the one stored in the data
+    """
+    frame_start = max(frame_start, data.frame_start)
+    frame_end = min(frame_end, data.frame_end)
+    orientations, matrices = data.chunk(frame_start, frame_end)
+
+    jobs = []
+    for index, frame in enumerate(range(frame_start, frame_end + 1)):
+        jobs.append(FrameJob(frame, data.source_filepath(frame, source),
+                             frames.frame_output_path(output, frame), matrices[index]))
+
+    return jobs
+
+
+# ###############################
+# Scene Functions
+# ###############################
+
+def scene_resolution(scene):
+    """return the output width and height of the scene"""
+    render = scene.render
+    return (render.resolution_x * render.resolution_percentage // 100,
+            render.resolution_y * render.resolution_percentage // 100)
+
+
+def clip_sequence(movieclip):
+    """return the absolute filepath of the clip and the offset from scene frames to file numbers"""
+    from .core import get_sequence_start
+
+    # the same sequence start as the world texture
+    filepath = bpy.path.abspath(movieclip.filepath)
+    offset = movieclip.frame_offset + get_sequence_start(movieclip) - movieclip.frame_start
+
+    return filepath, offset
+
+
+def scene_frame_jobs(scene, movieclip):
+    """return the FrameJob of every scene frame, with the same frame mapping as the world texture"""
+    from .core import get_orientation_table
+
+    table = get_orientation_table(movieclip)
+    filepath, offset = clip_sequence(movieclip)
+
+    jobs = []
+    for frame in range(scene.frame_start, scene.frame_end + 1):
+        index = frame - table.frame_start
+
+        if 0 <= index < len(table):
+            matrix = table.matrices[index]
+        else:
+            matrix = np.identity(3)
+
+        source = frames.sequence_filepath(filepath, frame + offset)
+        output = bpy.path.abspath(scene.render.frame_path(frame=frame))
+        jobs.append(FrameJob(frame, source, output, matrix))
+
+    return jobs
+
+
+# ###############################
+# Operators
+# ###############################
+
+if bpy:
+    class CLIP_OT_panorama_render_cpu(bpy.types.Operator):
+        """"""
+        bl_idname = "clip.panorama_render_cpu"
+        bl_label = "Render Stabilized (CPU)"
+        bl_description = "Write the stabilized frames to the render output without using Cycles"
+        bl_options = {'REGISTER'}
+
+        @classmethod
+        def poll(cls, context):
+            scene = context.scene
+            movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+            return movieclip and movieclip.source == 'SEQUENCE'
+
+        def execute(self, context):
+            scene = context.scene
+            movieclip = bpy.data.movieclips.get(scene.panorama_movieclip)
+
+            jobs = scene_frame_jobs(scene, movieclip)
+            width, height = scene_resolution(scene)
+
+            wm = context.window_manager
+            wm.progress_begin(0, len(jobs))
+
+            def report(job, seconds):
+                wm.progress_update(job.frame - scene.frame_start)
+
+            from .core import get_preferences, get_raw_store
+
+            settings = movieclip.panorama_settings
+            budget = get_preferences(context).frame_cache_budget * 1024 * 1024
+            _reproject.stats.reset()
+
+            global last_cache_stats
+
+            start = time.time()
+            try:
+                cache_stats = last_cache_stats = render_frames(jobs, width, height, scene, report, settings.yaw_tolerance,
+                                            cache_budget=budget, raw_store=get_raw_store(context))
+            finally:
+                wm.progress_end()
+
+            self.report({'INFO'}, "{0} frames stabilized in {1:.1f}s, {2}, frame cache {3}".format(
+                len(jobs), time.time() - start, _reproject.stats, cache_stats))
+            return {'FINISHED'}
+
+
+# ###############################
+#  Register / Unregister
+# ###############################
+
+def register():
+    bpy.utils.register_class(CLIP_OT_panorama_render_cpu)
+
+
+def unregister():
+    bpy.utils.unregister_class(CLIP_OT_panorama_render_cpu)
@@ -0,0 +1,307 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+CPU reprojection of equirectangular frames
+
+Same math as preview.fp: every output pixel is converted to a direction,
+rotated by the transposed orientation matrix and looked up back in the
+source frame. Images are (H,W,C) arrays with the bottom row first, as
+Blender stores image pixels.
+"""
+
+import numpy as np
+
+from math import (
+        acos,
+        atan2,
+        cos,
+        pi,
+        sin,
+        )
+
+
+# ###############################
+#  Geometry Functions
+# ###############################
+
+class DirectionGrid:
+    """
+    direction of every pixel center of an equirectangular image, equirectangular2world in preview.fp
+    only the per row and per column trig tables are kept, the (H,W,3) directions
+    are built once for small resolutions and per band of rows otherwise
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        u = (np.arange(width, dtype=np.float32) + 0.5) / width
+        v = (np.arange(height, dtype=np.float32) + 0.5) / height
+
+        phi = (0.5 - u) * np.float32(2.0 * pi)
+        theta = (v - 0.5) * np.float32(pi)
+
+        # trig tables, per column and per row
+        self.cos_phi = np.cos(phi)
+        self.sin_phi = np.sin(phi)
+        self.cos_theta = np.cos(theta)
+        self.sin_theta = np.sin(theta)
+
+        self.directions = None
+        if width * height <= GRID_FULL_PIXELS:
+            self.directions = self.band(0, height)
+            self.directions.flags.writeable = False
+
+    def band(self, start=0, end=None):
+        """return the (rows,W,3) directions of rows start to end"""
+        if self.directions is not None:
+            return self.directions[start:end]
+
+        cos_theta = self.cos_theta[start:end, np.newaxis]
+
+        directions = np.empty((len(cos_theta), self.width, 3), dtype=np.float32)
+        np.multiply(self.cos_phi[np.newaxis, :], cos_theta, out=directions[..., 0])
+        np.multiply(self.sin_phi[np.newaxis, :], cos_theta, out=directions[..., 1])
+        directions[..., 2] = self.sin_theta[start:end, np.newaxis]
+        return directions
+
+    def rotate(self, matrix, start=0, end=None):
+        """return the directions of rows start to end rotated by the transposed matrix"""
+        return np.dot(self.band(start, end), np.asarray(matrix, dtype=np.float32))
+
+
+# resolutions up to this many pixels keep their full (H,W,3) directions, 12 bytes per pixel
+GRID_FULL_PIXELS = 2048 * 1024
+
+
+# only keep the grids of the most recent resolutions
+GRID_CACHE_SIZE = 2
+
+_grids = []
+
+
+def get_direction_grid(width, height):
+    """return the cached DirectionGrid for the resolution"""
+    for grid in _grids:
+        if grid.width == width and grid.height == height:
+            if grid is not _grids[-1]:
+                _grids.remove(grid)
+                _grids.append(grid)
+            return grid
+
+    grid = DirectionGrid(width, height)
+    _grids.append(grid)
+
+    while len(_grids) > GRID_CACHE_SIZE:
+        del _grids[0]
+
+    return grid
+
+
+def clear_direction_grids():
+    """free the cached direction grids"""
+    del _grids[:]
+
+
+def equirectangular_to_world(width, height):
+    """return the (H,W,3) directions of the pixel centers, equirectangular2world in preview.fp"""
+    return get_direction_grid(width, height).band()
+
+
+def world_to_equirectangular(directions):
+    """return the u, v coordinates of (...,3) directions, world2equirectangular in preview.fp"""
+    x = directions[..., 0]
+    y = directions[..., 1]
+    z = np.clip(directions[..., 2], -1.0, 1.0)
+
+    u = 0.5 * (np.arctan2(x, y) / pi) + 0.25
+    v = 0.5 + np.arcsin(z) / pi
+
+    return u, v
+
+
+def split_yaw(matrix):
+    """
+    split the orientation matrix into a rotation around the vertical axis and a residual
+    return the yaw angle and the angle of the residual rotation, in radians
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+
+    # yaw that brings the residual rotation closest to identity
+    yaw = atan2(matrix[1, 0] - matrix[0, 1], matrix[0, 0] + matrix[1, 1])
+
+    trace = cos(yaw) * (matrix[0, 0] + matrix[1, 1]) + sin(yaw) * (matrix[1, 0] - matrix[0, 1]) + matrix[2, 2]
+    residual = acos(min(1.0, max(-1.0, (trace - 1.0) * 0.5)))
+
+    return yaw, residual
+
+
+# ###############################
+#  Sampling
+# ###############################
+
+def sample_bilinear(image, x, y):
+    """
+    sample the image at the x, y pixel coordinates with bilinear filtering
+    x wraps around (longitude), y is clamped (latitude)
+    """
+    height, width = image.shape[:2]
+
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0).astype(np.float32)[..., np.newaxis]
+    fy = (y - y0).astype(np.float32)[..., np.newaxis]
+
+    x0 = x0.astype(np.intp) % width
+    x1 = (x0 + 1) % width
+    y0 = y0.astype(np.intp)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    np.clip(y0, 0, height - 1, out=y0)
+
+    top = image[y1, x0] * (1.0 - fx) + image[y1, x1] * fx
+    bottom = image[y0, x0] * (1.0 - fx) + image[y0, x1] * fx
+
+    return bottom * (1.0 - fy) + top * fy
+
+
+def roll_columns(image, shift):
+    """
+    return the image shifted horizontally by a (sub-pixel) number of columns
+    output column j is the source at column j + shift, as sample_bilinear does
+    """
+    width = image.shape[1]
+    offset = int(np.floor(shift))
+    fraction = shift - offset
+
+    left = np.roll(image, -offset, axis=1)
+    if fraction < 1e-4:
+        return left
+
+    right = np.roll(left, -1, axis=1)
+    return left * np.float32(1.0 - fraction) + right * np.float32(fraction)
+
+
+def to_image(samples, dtype):
+    """convert filtered samples back to the source pixel type"""
+    if np.issubdtype(dtype, np.integer):
+        limits = np.iinfo(dtype)
+        samples = np.clip(samples + 0.5, limits.min, limits.max)
+
+    return samples.astype(dtype)
+
+
+# ###############################
+# Main function
+# ###############################
+
+class ReprojectStats:
+    """how many frames took each path"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.yaw_frames = 0
+        self.full_frames = 0
+
+    @property
+    def frames(self):
+        return self.yaw_frames + self.full_frames
+
+    def __str__(self):
+        return "{0} of {1} frames took the yaw fast path".format(self.yaw_frames, self.frames)
+
+
+stats = ReprojectStats()
+
+# residual rotation, in pixels at the equator, below which only the yaw is applied
+YAW_TOLERANCE = 0.5
+
+# output rows processed at once, bounds the size of the intermediate arrays
+BAND_HEIGHT = 128
+
+
+def reproject_band(image, grid, matrix, output, start, end):
+    """reproject the output rows start to end, only reading the source rows they reach"""
+    height, width = image.shape[:2]
+
+    # transformation_matrix * direction with the matrix uploaded transposed
+    u, v = world_to_equirectangular(grid.rotate(matrix, start, end))
+    x = u * width - 0.5
+    y = v * height - 0.5
+
+    first = min(height - 1, max(0, int(np.floor(y.min()))))
+    last = min(height - 1, max(0, int(np.floor(y.max())) + 1))
+    y -= first
+
+    output[start:end] = to_image(sample_bilinear(image[first:last + 1], x, y), image.dtype)
+
+
+def reproject(image, matrix, width=None, height=None, yaw_tolerance=YAW_TOLERANCE,
+              threads=1, band_height=BAND_HEIGHT):
+    """
+    return the stabilized image
+    image : (H,W,C) source equirectangular frame
+    matrix : (3,3) orientation matrix, as solver.orientation_matrices
+    width, height : output resolution, defaults to the source resolution
+    yaw_tolerance : residual (non-yaw) rotation in pixels under which the frame
+                    is only shifted horizontally, negative to always remap
+    threads : number of threads the output bands are distributed to
+    band_height : number of output rows processed at once
+    """
+    if width is None:
+        width = image.shape[1]
+
+    if height is None:
+        height = image.shape[0]
+
+    bands = [(start, min(height, start + band_height)) for start in range(0, height, max(1, band_height))]
+    output = np.empty((height, width) + image.shape[2:], dtype=image.dtype)
+
+    if (width, height) == image.shape[1::-1] and yaw_tolerance >= 0.0:
+        yaw, residual = split_yaw(matrix)
+
+        if residual * width / (2.0 * pi) <= yaw_tolerance:
+            stats.yaw_frames += 1
+            shift = (yaw / (2.0 * pi) * width) % width
+
+            for start, end in bands:
+                output[start:end] = to_image(roll_columns(image[start:end], shift), image.dtype)
+            return output
+
+    stats.full_frames += 1
+
+    grid = get_direction_grid(width, height)
+
+    if threads > 1 and len(bands) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # numpy releases the GIL in its kernels, the bands run in parallel
+        with ThreadPoolExecutor(min(threads, len(bands))) as executor:
+            futures = [executor.submit(reproject_band, image, grid, matrix, output, start, end)
+                       for start, end in bands]
+            for future in futures:
+                future.result()
+    else:
+        for start, end in bands:
+            reproject_band(image, grid, matrix, output, start, end)
+
+    return output
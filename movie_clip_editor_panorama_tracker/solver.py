@@ -0,0 +1,167 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Batch version of the orientation solver in geometry.py
+
+All the functions work on N frames at once, (N,2) marker coordinates in,
+(N,3,3) matrices or (N,3) euler rotations out. Matrices are row-major, the
+same layout as mathutils.Matrix((row0, row1, row2)).
+"""
+
+import numpy as np
+
+from math import pi
+
+# same threshold mathutils uses to detect gimbal lock
+FLT_EPSILON = 1.1920928955078125e-07
+
+
+# ###############################
+#  Geometry Functions
+# ###############################
+
+def equirectangular_to_sphere(uv):
+    """
+    convert (N,2) 2d points to (N,3) unit vectors
+    uv : 0,0 (bottom left) 1,1 (top right)
+    """
+    uv = np.asarray(uv, dtype=np.float64)
+    u = uv[..., 0]
+    v = uv[..., 1]
+
+    phi = (0.5 - u) * 2 * pi
+    theta = (v - 0.5) * pi
+    r = np.cos(theta)
+
+    return np.stack((np.cos(phi) * r, np.sin(phi) * r, np.sin(theta)), axis=-1)
+
+
+def normalize(vectors):
+    """normalize (N,3) vectors, zero length vectors are left untouched"""
+    length = np.sqrt(np.einsum('...i,...i->...', vectors, vectors))
+    length[length == 0.0] = 1.0
+    return vectors / length[..., np.newaxis]
+
+
+def euler_to_matrix(euler):
+    """(N,3) XYZ euler rotations to (N,3,3) matrices, as Euler.to_matrix()"""
+    euler = np.asarray(euler, dtype=np.float64)
+    ci, cj, ch = np.rollaxis(np.cos(euler), -1)
+    si, sj, sh = np.rollaxis(np.sin(euler), -1)
+
+    cc = ci * ch
+    cs = ci * sh
+    sc = si * ch
+    ss = si * sh
+
+    matrix = np.empty(euler.shape[:-1] + (3, 3))
+    matrix[..., 0, 0] = cj * ch
+    matrix[..., 0, 1] = sj * sc - cs
+    matrix[..., 0, 2] = sj * cc + ss
+    matrix[..., 1, 0] = cj * sh
+    matrix[..., 1, 1] = sj * ss + cc
+    matrix[..., 1, 2] = sj * cs - sc
+    matrix[..., 2, 0] = -sj
+    matrix[..., 2, 1] = cj * si
+    matrix[..., 2, 2] = cj * ci
+
+    return matrix
+
+
+def matrix_to_euler(matrix):
+    """
+    (N,3,3) matrices to (N,3) XYZ euler rotations, as Matrix.to_euler()
+    of the two possible solutions the one with the smallest angles is used
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+
+    # mathutils normalizes the columns first
+    length = np.sqrt(np.einsum('...ij,...ij->...j', matrix, matrix))
+    length[length == 0.0] = 1.0
+    matrix = matrix / length[..., np.newaxis, :]
+
+    m00 = matrix[..., 0, 0]
+    m10 = matrix[..., 1, 0]
+    m20 = matrix[..., 2, 0]
+    m21 = matrix[..., 2, 1]
+    m22 = matrix[..., 2, 2]
+    m11 = matrix[..., 1, 1]
+    m12 = matrix[..., 1, 2]
+
+    cy = np.hypot(m00, m10)
+    regular = cy > 16.0 * FLT_EPSILON
+
+    eul1 = np.stack((
+        np.where(regular, np.arctan2(m21, m22), np.arctan2(-m12, m11)),
+        np.arctan2(-m20, cy),
+        np.where(regular, np.arctan2(m10, m00), 0.0),
+        ), axis=-1)
+
+    eul2 = np.stack((
+        np.arctan2(-m21, -m22),
+        np.arctan2(-m20, -cy),
+        np.arctan2(-m10, -m00),
+        ), axis=-1)
+    eul2[~regular] = eul1[~regular]
+
+    use_eul2 = np.abs(eul1).sum(axis=-1) > np.abs(eul2).sum(axis=-1)
+    return np.where(use_eul2[..., np.newaxis], eul2, eul1)
+
+
+# ###############################
+# Main functions
+# ###############################
+
+def orientation_matrices(focus, target, flip, reference=(0.0, 0.0, 0.0)):
+    """
+    return the (N,3,3) compound orientation matrices of the tracker + scene orientations
+    focus, target : (N,2) marker coordinates of the focus and target tracks
+    flip : settings.flip
+    reference : settings.orientation, XYZ euler
+    """
+    vecx = equirectangular_to_sphere(focus)
+    vecy = equirectangular_to_sphere(target)
+
+    if flip:
+        vecz = np.cross(vecx, vecy)
+    else:
+        vecz = np.cross(vecy, vecx)
+    vecz = normalize(vecz)
+
+    # retarget y axis again
+    nvecy = normalize(np.cross(vecz, vecx))
+
+    # rows are the sphere orientation vectors
+    matrix = np.stack((vecx, nvecy, vecz), axis=-2)
+    return np.einsum('ij,njk->nik', euler_to_matrix(reference), matrix)
+
+
+def solve_orientations(focus, target, flip, reference=(0.0, 0.0, 0.0), valid=None):
+    """
+    return the (N,3) orientations, as core.calculate_orientation for every frame
+    valid : optional (N,) booleans, frames without both markers get (0,0,0)
+    """
+    orientations = -matrix_to_euler(orientation_matrices(focus, target, flip, reference))
+
+    if valid is not None:
+        orientations[~np.asarray(valid, dtype=bool)] = 0.0
+
+    return orientations
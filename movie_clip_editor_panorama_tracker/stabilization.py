@@ -0,0 +1,150 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Stabilization data file, the solved orientation of every frame
+
+A small header (clip frame range and mapping, resolution, sequence
+path) followed by one fixed size record per frame, so the file can be
+memory-mapped and a render node only reads the frames of its chunk.
+Only needs numpy, no Blender and no tracking data.
+
+    header  : '<8sHHiiiiiiiII' (see HEADER), padded to HEADER_SIZE
+    filepath: utf-8 path of the image sequence
+    records : RECORD, from data_offset (a multiple of 16)
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from . import frames
+
+MAGIC = b'PTSTAB\x00\x00'
+VERSION = 1
+
+# magic, version, flags, frame_start, frame_count, frame_offset, sequence_start,
+# clip_frame_start, width, height, filepath size, data offset
+HEADER = struct.Struct('<8sHHiiiiiiiII')
+HEADER_SIZE = 64
+
+# orientation as core.calculate_orientation, matrix as solver.orientation_matrices
+RECORD = np.dtype([
+        ('orientation', '<f8', (3,)),
+        ('matrix', '<f8', (3, 3)),
+        ])
+
+EXTENSION = ".ptstab"
+
+
+class StabilizationData:
+    """
+    orientations of the frames frame_start to frame_end of a clip
+    records : (N,) RECORD array, memory-mapped when loaded from a file
+    """
+
+    def __init__(self, frame_start, records, frame_offset=0, sequence_start=1, clip_frame_start=1,
+                 width=0, height=0, filepath=""):
+        self.frame_start = frame_start
+        self.records = records
+        self.frame_offset = frame_offset
+        self.sequence_start = sequence_start
+        self.clip_frame_start = clip_frame_start
+        self.width = width
+        self.height = height
+        self.filepath = filepath
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def frame_end(self):
+        return self.frame_start + len(self) - 1
+
+    @property
+    def file_offset(self):
+        """from scene frames to sequence file numbers, as the world texture maps them"""
+        return self.frame_offset + self.sequence_start - self.clip_frame_start
+
+    def chunk(self, frame_start, frame_end):
+        """return copies of the (N,3) orientations and (N,3,3) matrices of the frames, only reading those"""
+        start = max(0, frame_start - self.frame_start)
+        end = min(len(self), frame_end - self.frame_start + 1)
+        records = np.array(self.records[start:max(start, end)])
+
+        return records['orientation'], records['matrix']
+
+    def source_filepath(self, frame, filepath=None):
+        """return the sequence file of the frame, filepath replaces the stored sequence path"""
+        return frames.sequence_filepath(filepath or self.filepath, frame + self.file_offset)
+
+
+def from_table(table, frame_offset=0, sequence_start=1, clip_frame_start=1, width=0, height=0, filepath=""):
+    """return the StabilizationData of a bake.OrientationTable"""
+    records = np.empty(len(table), dtype=RECORD)
+    records['orientation'] = table.orientations
+    records['matrix'] = table.matrices
+
+    return StabilizationData(table.frame_start, records, frame_offset, sequence_start, clip_frame_start,
+                             width, height, filepath)
+
+
+def write(filepath, data):
+    """write the StabilizationData, written aside and renamed so readers never see a partial file"""
+    path = data.filepath.encode('utf-8')
+    data_offset = (HEADER_SIZE + len(path) + 15) // 16 * 16
+
+    header = HEADER.pack(MAGIC, VERSION, 0, data.frame_start, len(data), data.frame_offset,
+                         data.sequence_start, data.clip_frame_start, data.width, data.height,
+                         len(path), data_offset)
+
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\x00'))
+        f.write(path.ljust(data_offset - HEADER_SIZE, b'\x00'))
+        f.write(np.ascontiguousarray(data.records, dtype=RECORD).tobytes())
+
+    os.replace(temp_filepath, filepath)
+
+
+def load(filepath):
+    """return the StabilizationData of the file, the records are memory-mapped"""
+    with open(filepath, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+
+        if len(header) < HEADER.size or header[:8] != MAGIC:
+            raise ValueError("'{0}' is not a stabilization data file".format(filepath))
+
+        (magic, version, flags, frame_start, frame_count, frame_offset, sequence_start,
+         clip_frame_start, width, height, path_size, data_offset) = HEADER.unpack(header[:HEADER.size])
+
+        if version > VERSION:
+            raise ValueError("'{0}' is version {1}, only up to {2} is supported".format(filepath, version, VERSION))
+
+        path = f.read(path_size).decode('utf-8')
+
+    if frame_count:
+        records = np.memmap(filepath, dtype=RECORD, mode='r', offset=data_offset, shape=(frame_count,))
+    else:
+        records = np.empty(0, dtype=RECORD)
+
+    return StabilizationData(frame_start, records, frame_offset, sequence_start, clip_frame_start,
+                             width, height, path)
@@ -0,0 +1,100 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+import numpy as np
+
+
+# ###############################
+# Track Data
+# ###############################
+
+class TrackData:
+    """
+    markers of a track as contiguous arrays, sorted by frame
+    only used to bake all the frames at once, the frame change handler and the
+    preview keep the single find_frame lookup, which always reflects marker edits
+    """
+
+    def __init__(self, frames, co, mute):
+        order = np.argsort(frames, kind='mergesort')
+
+        self.frames = frames[order]
+        self.co = co[order]
+        self.mute = mute[order]
+
+        # frame -> marker index, -1 where the track has no marker
+        if len(self.frames):
+            self.frame_start = int(self.frames[0])
+            self.lookup = np.full(int(self.frames[-1]) - self.frame_start + 1, -1, dtype=np.int32)
+            self.lookup[self.frames - self.frame_start] = np.arange(len(self.frames), dtype=np.int32)
+        else:
+            self.frame_start = 0
+            self.lookup = np.empty(0, dtype=np.int32)
+
+    @classmethod
+    def from_track(cls, track):
+        """read all the markers of a MovieTrackingTrack in bulk"""
+        markers = track.markers
+        count = len(markers)
+
+        frames = np.empty(count, dtype=np.int32)
+        markers.foreach_get("frame", frames)
+
+        co = np.empty(count * 2, dtype=np.float32)
+        markers.foreach_get("co", co)
+
+        mute = [False] * count
+        markers.foreach_get("mute", mute)
+
+        return cls(frames, co.reshape(count, 2), np.array(mute, dtype=bool))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def indices(self, frames):
+        """return the marker index for each of the frames, -1 for missing markers"""
+        frames = np.asarray(frames, dtype=np.int64) - self.frame_start
+        inside = (frames >= 0) & (frames < len(self.lookup))
+
+        indices = np.full(frames.shape, -1, dtype=np.int32)
+        indices[inside] = self.lookup[frames[inside]]
+        return indices
+
+    def coordinates(self, frames):
+        """
+        return the (N,2) coordinates for the frames and which of them have a marker
+        as with markers.find_frame, muted markers are still returned
+        """
+        indices = self.indices(frames)
+        valid = indices != -1
+
+        coordinates = np.zeros(indices.shape + (2,))
+        coordinates[valid] = self.co[indices[valid]]
+        return coordinates, valid
+
+
+def get_track_data(tracking, name):
+    """return the TrackData of the named track, or None"""
+    track = tracking.tracks.get(name)
+
+    if not track:
+        return None
+
+    return TrackData.from_track(track)
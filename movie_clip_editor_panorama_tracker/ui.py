@@ -47,11 +47,60 @@ class CLIP_PanoramaPanel(bpy.types.Panel):
 
         col.separator()
         col.operator("clip.panorama_camera", icon="CAMERA_DATA")
+        col.operator("clip.panorama_render_cpu", icon="RENDER_ANIMATION")
+
+        from . import render
+        if render.last_cache_stats:
+            col.label(text="Frame cache: {0}".format(render.last_cache_stats))
+
+        col.operator("clip.panorama_export", icon="RENDER_ANIMATION")
+        col.prop(settings, "yaw_tolerance")
         col.operator("clip.panorama_reset", icon="CANCEL")
 
+        col.separator()
+        col.operator("clip.panorama_bake")
+        col.prop(settings, "bake_orientation")
+        col.operator("clip.panorama_keyframes", icon="KEY_HLT")
+        col.prop(settings, "use_keyframes")
+        col.operator("clip.panorama_save_data", icon="FILE_TICK")
+        col.prop(settings, "data_filepath", text="")
+
+        from .core import get_data_error
+        error = get_data_error(settings)
+        if error:
+            col.label(text=error, icon='ERROR')
+
         col.separator()
         col.prop(settings, "show_preview")
 
+        if settings.show_preview:
+            col.prop(settings, "preview_backend", text="")
+
+            if bpy.panorama_globals.backend == 'CPU':
+                from .preview_cpu import PREVIEW_IMAGE, stats, get_cache_stats
+                col.label(text="Image: " + PREVIEW_IMAGE)
+                col.label(text=str(stats))
+
+                cache_stats = get_cache_stats()
+                if cache_stats:
+                    col.label(text="Frame cache: {0}".format(cache_stats))
+            else:
+                col.prop(settings, "preview_quality", text="")
+                col.label(text=str(bpy.panorama_globals.stats))
+
+        col.separator()
+        wm = context.window_manager
+        col.prop(wm, "panorama_profiling")
+
+        if wm.panorama_profiling:
+            from . import profiling
+            for timer in profiling.timers():
+                col.label(text=str(timer))
+
+            row = col.row(align=True)
+            row.operator("clip.panorama_profile_dump")
+            row.operator("clip.panorama_profile_reset")
+
 
 # ###############################
 #  Register / Unregister
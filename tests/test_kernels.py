@@ -0,0 +1,422 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Tests of the bpy-free modules, they run in plain Python with numpy
+
+    $ python3 -m unittest discover tests
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from math import cos, sin
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from movie_clip_editor_panorama_tracker import (
+        bake,
+        export,
+        frames,
+        framestore,
+        geometry,
+        profiling,
+        reproject,
+        solver,
+        stabilization,
+        )
+from movie_clip_editor_panorama_tracker.render import FrameJob
+
+
+def synthetic_markers(count, seed=0):
+    """random focus and target positions, always a few degrees apart"""
+    random = np.random.RandomState(seed)
+    focus = random.uniform(0.05, 0.95, (count, 2))
+    target = (focus + random.uniform(0.02, 0.1, (count, 2))) % 1.0
+    return focus, target
+
+
+def yaw_matrix(angle):
+    return np.array(((cos(angle), -sin(angle), 0.0),
+                     (sin(angle), cos(angle), 0.0),
+                     (0.0, 0.0, 1.0)))
+
+
+class TestSolverGeometry(unittest.TestCase):
+    """the batch solver and the single frame geometry give the same orientations"""
+
+    def check(self, flip, reference):
+        focus, target = synthetic_markers(200)
+
+        batch = solver.solve_orientations(focus, target, flip, reference)
+        single = np.array([geometry.solve_orientation(tuple(f), tuple(t), flip, reference)
+                           for f, t in zip(focus, target)])
+
+        np.testing.assert_allclose(batch, single, rtol=0.0, atol=1e-12)
+
+    def test_flip(self):
+        self.check(True, (0.0, 0.0, 0.0))
+
+    def test_no_flip(self):
+        self.check(False, (0.0, 0.0, 0.0))
+
+    def test_reference(self):
+        self.check(True, (0.1, -0.2, 0.3))
+        self.check(False, (0.4, 0.5, -0.6))
+
+    def test_euler_round_trip(self):
+        euler = (0.1, -0.2, 0.3)
+        matrix = geometry.euler_to_matrix(euler)
+        np.testing.assert_allclose(geometry.matrix_to_euler(matrix), euler, atol=1e-12)
+        np.testing.assert_allclose(solver.euler_to_matrix(euler), matrix, atol=1e-12)
+
+
+class TestOriginalOrientation(unittest.TestCase):
+    """
+    orientations of the per-frame mathutils code the solver replaced
+    (core.calculate_orientation and mapping_node_order_flip), values
+    computed with mathutils, in single precision
+    """
+
+    # focus, target, flip, reference, orientation, mapping node rotation
+    CASES = (
+            ((0.25, 0.5), (0.3, 0.52), True, (0.0, 0.0, 0.0),
+             (0.0, 2.940742, 1.570796), (2.940742, 0.0, 1.570796)),
+            ((0.1, 0.3), (0.15, 0.35), True, (0.0, 0.0, 0.0),
+             (0.047974, 2.391449, 0.463178), (-0.443499, 2.513274, -0.628318)),
+            ((0.7, 0.6), (0.65, 0.62), False, (0.0, 0.0, 0.0),
+             (2.923034, 0.344793, 1.253214), (-2.880227, -0.314159, -1.256637)),
+            ((0.5, 0.8), (0.55, 0.75), True, (0.1, -0.2, 0.3),
+             (-2.295116, 0.991823, -0.966498), (-0.084931, -1.943223, -2.595160)),
+            ((0.9, 0.2), (0.85, 0.25), False, (0.4, 0.5, -0.6),
+             (1.322075, 2.096453, -0.832220), (-1.326288, 2.106270, -0.847228)),
+            ((0.33, 0.45), (0.4, 0.47), True, (0.0, 0.0, 1.5),
+             (-0.191609, 3.117939, 0.566847), (0.149859, 3.019441, -0.555392)),
+            )
+
+    TOLERANCE = 1e-5
+
+    def test_geometry(self):
+        for focus, target, flip, reference, orientation, rotation in self.CASES:
+            result = geometry.solve_orientation(focus, target, flip, reference)
+            np.testing.assert_allclose(result, orientation, rtol=0.0, atol=self.TOLERANCE)
+            np.testing.assert_allclose(geometry.mapping_node_order_flip(result), rotation,
+                                       rtol=0.0, atol=self.TOLERANCE)
+
+    def test_solver(self):
+        for focus, target, flip, reference, orientation, rotation in self.CASES:
+            result = solver.solve_orientations(np.array((focus,)), np.array((target,)), flip, reference)
+            np.testing.assert_allclose(result[0], orientation, rtol=0.0, atol=self.TOLERANCE)
+
+    def test_invalid(self):
+        focus, target, flip, reference, orientation, rotation = self.CASES[1]
+        result = solver.solve_orientations(np.array((focus, focus)), np.array((target, target)), flip, reference,
+                                           valid=(True, False))
+        np.testing.assert_allclose(result[0], orientation, rtol=0.0, atol=self.TOLERANCE)
+        np.testing.assert_array_equal(result[1], (0.0, 0.0, 0.0))
+
+
+class TestReproject(unittest.TestCase):
+
+    def setUp(self):
+        reproject.clear_direction_grids()
+        self.image = np.random.RandomState(1).randint(0, 255, (64, 128, 3)).astype(np.uint8)
+
+    def test_yaw_fast_path(self):
+        """a pure yaw only shifts the columns, as the full remap does"""
+        matrix = yaw_matrix(0.7)
+
+        reproject.stats.reset()
+        fast = reproject.reproject(self.image, matrix)
+        self.assertEqual(reproject.stats.yaw_frames, 1)
+
+        full = reproject.reproject(self.image, matrix, yaw_tolerance=-1.0)
+        self.assertEqual(reproject.stats.full_frames, 1)
+
+        self.assertLessEqual(np.abs(fast.astype(int) - full).max(), 1)
+
+    def test_bands(self):
+        """the output does not depend on the bands, the threads or how the directions are kept"""
+        focus, target = synthetic_markers(1)
+        matrix = solver.orientation_matrices(focus, target, True, (0.1, 0.2, 0.3))[0]
+
+        single = reproject.reproject(self.image, matrix, yaw_tolerance=-1.0, band_height=64)
+        banded = reproject.reproject(self.image, matrix, yaw_tolerance=-1.0, band_height=7, threads=3)
+        np.testing.assert_array_equal(single, banded)
+
+        full_pixels = reproject.GRID_FULL_PIXELS
+        try:
+            reproject.GRID_FULL_PIXELS = 0
+            reproject.clear_direction_grids()
+            tables = reproject.reproject(self.image, matrix, yaw_tolerance=-1.0, band_height=5)
+        finally:
+            reproject.GRID_FULL_PIXELS = full_pixels
+            reproject.clear_direction_grids()
+
+        np.testing.assert_array_equal(single, tables)
+
+    def test_identity(self):
+        output = reproject.reproject(self.image, np.identity(3), yaw_tolerance=-1.0)
+        self.assertLessEqual(np.abs(output.astype(int) - self.image).max(), 1)
+
+
+class TestStabilization(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "shot" + stabilization.EXTENSION)
+
+        focus, target = synthetic_markers(50)
+        matrices = solver.orientation_matrices(focus, target, True, (0.0, 0.0, 0.0))
+        orientations = -solver.matrix_to_euler(matrices)
+
+        self.table = bake.OrientationTable(10, None, orientations, matrices)
+        self.data = stabilization.from_table(self.table, frame_offset=3, sequence_start=101, clip_frame_start=10,
+                                             width=640, height=320, filepath="/shot/frame_0101.png")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        stabilization.write(self.filepath, self.data)
+        data = stabilization.load(self.filepath)
+
+        self.assertEqual((data.frame_start, data.frame_end, len(data)), (10, 59, 50))
+        self.assertEqual((data.frame_offset, data.sequence_start, data.clip_frame_start), (3, 101, 10))
+        self.assertEqual((data.width, data.height, data.filepath), (640, 320, "/shot/frame_0101.png"))
+        np.testing.assert_array_equal(data.records['orientation'], self.table.orientations)
+        np.testing.assert_array_equal(data.records['matrix'], self.table.matrices)
+
+    def test_chunk(self):
+        stabilization.write(self.filepath, self.data)
+        data = stabilization.load(self.filepath)
+
+        orientations, matrices = data.chunk(20, 29)
+        np.testing.assert_array_equal(orientations, self.table.orientations[10:20])
+        np.testing.assert_array_equal(matrices, self.table.matrices[10:20])
+
+        # clamped to the frames in the file
+        orientations, matrices = data.chunk(55, 80)
+        self.assertEqual(len(orientations), 5)
+        self.assertEqual(len(data.chunk(100, 120)[0]), 0)
+
+    def test_source_filepath(self):
+        # the first clip frame is the first file of the sequence, plus the frame offset
+        self.assertEqual(self.data.source_filepath(10), "/shot/frame_0104.png")
+        self.assertEqual(self.data.source_filepath(12, "/other/img_00001.exr"), "/other/img_00106.exr")
+
+    def test_invalid(self):
+        with open(self.filepath, 'wb') as f:
+            f.write(b'not a stabilization file')
+
+        self.assertRaises(ValueError, stabilization.load, self.filepath)
+
+
+class TestRawFrameStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store_directory = os.path.join(self.directory, "raw")
+        self.loaded = []
+
+        random = np.random.RandomState(2)
+        self.pixels = {}
+
+        for name in ("a.png", "b.png", "c.png"):
+            filepath = os.path.join(self.directory, name)
+            with open(filepath, 'wb') as f:
+                f.write(name.encode('utf-8'))
+            self.pixels[filepath] = random.randint(0, 255, (8, 16, 3)).astype(np.uint8)
+
+        self.a, self.b, self.c = sorted(self.pixels)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def loader(self, filepath):
+        self.loaded.append(filepath)
+        return self.pixels[filepath]
+
+    def store(self, max_size=framestore.DEFAULT_SIZE):
+        return framestore.RawFrameStore(self.store_directory, max_size, self.loader)
+
+    def raw_files(self):
+        return [name for name in os.listdir(self.store_directory) if name.endswith(".raw")]
+
+    def test_round_trip(self):
+        store = self.store()
+        np.testing.assert_array_equal(store.load(self.a), self.pixels[self.a])
+
+        # decoded once, then memory-mapped, also by another store
+        for store in (store, self.store()):
+            pixels = store.load(self.a)
+            self.assertIsInstance(pixels, np.memmap)
+            np.testing.assert_array_equal(pixels, self.pixels[self.a])
+
+        self.assertEqual(self.loaded, [self.a])
+        self.assertEqual(store.size(), framestore.HEADER_SIZE + self.pixels[self.a].nbytes)
+
+    def test_eviction(self):
+        file_size = framestore.HEADER_SIZE + self.pixels[self.a].nbytes
+        store = self.store(file_size * 2)
+
+        for filepath in (self.a, self.b, self.c):
+            store.load(filepath)
+
+        self.assertEqual(len(self.raw_files()), 2)
+        self.assertLessEqual(store.size(), file_size * 2)
+
+        # the newest file is always kept
+        store.load(self.c)
+        self.assertEqual(self.loaded, [self.a, self.b, self.c])
+
+    def test_truncated(self):
+        store = self.store()
+        store.load(self.a)
+
+        raw_filepath = store.raw_filepath(self.a)
+        with open(raw_filepath, 'r+b') as f:
+            f.truncate(framestore.HEADER_SIZE + 10)
+
+        # decoded and written again
+        np.testing.assert_array_equal(store.load(self.a), self.pixels[self.a])
+        self.assertEqual(self.loaded, [self.a, self.a])
+        self.assertEqual(os.path.getsize(raw_filepath), framestore.HEADER_SIZE + self.pixels[self.a].nbytes)
+
+    def test_purge(self):
+        store = self.store()
+        store.load(self.a)
+        store.load(self.b)
+
+        self.assertEqual(store.purge(), 2 * (framestore.HEADER_SIZE + self.pixels[self.a].nbytes))
+        self.assertEqual(self.raw_files(), [])
+
+
+class TestFrameCache(unittest.TestCase):
+    """without prefetch, so the evictions only depend on the requests"""
+
+    FRAME_SIZE = 100
+
+    def setUp(self):
+        self.loaded = []
+
+    def loader(self, filepath):
+        self.loaded.append(filepath)
+        return np.zeros(self.FRAME_SIZE, dtype=np.uint8)
+
+    def cache(self, budget, max_frames=1024):
+        return frames.FrameCache(lambda frame: frame, budget, 0, self.loader, max_frames)
+
+    def test_budget(self):
+        cache = self.cache(self.FRAME_SIZE * 2 + 50)
+
+        for frame in (1, 2, 3):
+            cache.get(frame)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, self.FRAME_SIZE * 2)
+        self.assertEqual((cache.stats.misses, cache.stats.evictions), (3, 1))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_lru_order(self):
+        cache = self.cache(self.FRAME_SIZE * 2)
+
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+
+        # 2 was the least recently used
+        cache.get(1)
+        cache.get(2)
+        self.assertEqual(self.loaded, [1, 2, 3, 2])
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (2, 4))
+
+    def test_max_frames(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filepath = os.path.join(directory, "frame.raw")
+            np.zeros(self.FRAME_SIZE, dtype=np.uint8).tofile(filepath)
+
+            # memory-mapped frames are not in the budget, only in the frame count
+            pixels = np.memmap(filepath, dtype=np.uint8, mode='r')
+            cache = frames.FrameCache(lambda frame: frame, 0, 0, lambda filepath: pixels, 2)
+
+            for frame in (1, 2, 3):
+                cache.get(frame)
+
+            self.assertEqual((len(cache), cache.size, cache.stats.evictions), (2, 0, 1))
+            del pixels, cache
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestExport(unittest.TestCase):
+
+    def test_split_chunks(self):
+        jobs = [FrameJob(frame, None, None, None) for frame in (5, 1, 4, 2, 3)]
+        chunks = export.split_chunks(jobs, 2)
+        self.assertEqual([[job.frame for job in chunk] for chunk in chunks], [[1, 2], [3, 4], [5]])
+        self.assertEqual(export.split_chunks([], 4), [])
+
+    def test_parse_frame_range(self):
+        self.assertEqual(export.parse_frame_range("1-40"), (1, 40))
+        self.assertEqual(export.parse_frame_range("7"), (7, 7))
+
+        for value in ("", "a-b", "1-", "1-2-3"):
+            self.assertRaises(argparse.ArgumentTypeError, export.parse_frame_range, value)
+
+
+class TestTimer(unittest.TestCase):
+
+    def test_percentile(self):
+        timer = profiling.Timer("test")
+        self.assertEqual(timer.percentile(95), 0.0)
+
+        for seconds in reversed(range(101)):
+            timer.add(float(seconds))
+
+        self.assertEqual((timer.percentile(0), timer.percentile(50), timer.percentile(95), timer.percentile(100)),
+                         (0.0, 50.0, 95.0, 100.0))
+        self.assertEqual(timer.mean, 50.0)
+
+    def test_window(self):
+        timer = profiling.Timer("test")
+
+        for seconds in range(profiling.WINDOW + 500):
+            timer.add(float(seconds))
+
+        # the count and the mean cover every call, the percentiles the recent ones
+        self.assertEqual(timer.count, profiling.WINDOW + 500)
+        self.assertEqual(timer.percentile(0), 500.0)
+        self.assertEqual(timer.to_dict()["max_ms"], (profiling.WINDOW + 499) * 1000.0)
+
+
+if __name__ == '__main__':
+    unittest.main()